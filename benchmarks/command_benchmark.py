@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Keep the bot off the real database; must be set before calendar_bot is imported
+os.environ.setdefault('CALENDAR_DB', os.path.join(tempfile.gettempdir(), 'calendar_bot_benchmark.db'))
+
+import calendar_bot
+from storage import Storage
+
+'''
+    Load test: drive the bot's command coroutines against synthetic calendars of 1k, 100k & 1M events
+    through a stub Discord context, reporting throughput, p50/p99 latency, peak memory, event loop
+    blocking & error replies per command; exits with status 1 if any command replied with an error.
+    Usage: python benchmarks/command_benchmark.py [--sizes 1000,100000,1000000] [--iterations 200] [--no-cache]
+'''
+GUILD_ID = 1
+SEED_BATCH = 50000
+CONTACTS = 997
+# Number of events reminded of at once by the check_reminders case
+REMINDER_BURST = 20
+# Loop lag above this many seconds counts as the event loop being blocked
+BLOCK_THRESHOLD = 0.005
+
+'''
+    Stub Discord objects: just enough of a context, guild, channel & message for the commands
+'''
+class StubMessage:
+    def __init__(self, content=None, embed=None, file=None):
+        self.id = id(self)
+        self.content = content
+        self.embed = embed
+        self.file = file
+        self.attachments = []
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def remove_reaction(self, emoji, user):
+        pass
+
+    async def edit(self, **kwargs):
+        self.embed = kwargs.get('embed', self.embed)
+
+# Counts messages sent to it & keeps the errors commands reply with (the exception itself or 'Error: ...')
+class StubChannel:
+    def __init__(self, name):
+        self.name = name
+        self.sent = 0
+        self.errors = []
+
+    async def send(self, content=None, *, embed=None, file=None, **kwargs):
+        self.sent += 1
+        if isinstance(content, Exception) or str(content).startswith('Error'):
+            self.errors.append(str(content))
+        return StubMessage(content, embed, file)
+
+class StubGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f'Benchmark guild {guild_id}'
+        self.text_channels = [StubChannel(calendar_bot.ANNOUNCEMENT_CHANNEL)]
+
+class StubUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f'bencher{user_id}'
+
+class StubContext:
+    def __init__(self, guild):
+        self.guild = guild
+        self.channel = guild.text_channels[0]
+        self.author = StubUser(1)
+        self.message = StubMessage()
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+# Stand in for the parts of the bot that need a Discord connection
+def stub_bot(guild):
+    async def wait_for(event, timeout=None, check=None):
+        raise asyncio.TimeoutError
+
+    calendar_bot.bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+    calendar_bot.bot.wait_for = wait_for
+
+'''
+    Event loop blocking: a task that should wake every interval measures how late it wakes up
+'''
+class LoopMonitor:
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.reset()
+
+    def reset(self):
+        self.blocked = 0.0
+        self.max_stall = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > BLOCK_THRESHOLD:
+                self.blocked += lag
+                self.max_stall = max(self.max_stall, lag)
+
+'''
+    Synthetic calendars
+'''
+# Event rows spread over the next year, as '.add_event' stores them
+def make_events(start, stop):
+    first_day = date.today() + timedelta(days=1)
+    for i in range(start, stop):
+        yield (f'Event {i}', first_day + timedelta(days=i % 365), f'{i % 12 + 1}:{i % 60:02d} PM', f'Room {i % 300}', f'contact{i % CONTACTS}')
+
+# Open (seeding it first if needed) a database of n events in db_dir, returning (storage, seconds spent seeding)
+async def open_database(db_dir, n):
+    path = os.path.join(db_dir, f'calendar-{n}.db')
+    storage = Storage(path)
+    storage.connect()
+    if await storage.count_events(GUILD_ID) == n:
+        return storage, 0.0
+
+    start = time.perf_counter()
+    await storage.clear_events(GUILD_ID)
+    for batch in range(0, n, SEED_BATCH):
+        await storage.insert_events(GUILD_ID, list(make_events(batch, min(batch + SEED_BATCH, n))))
+    return storage, time.perf_counter() - start
+
+# Point the bot at a storage, warming its caches unless benchmarking the database path
+async def use_storage(storage, use_cache):
+    await calendar_bot.storage.close()
+    calendar_bot.storage = storage
+    calendar_bot.scheduler.record = storage.mark_reminders_sent
+    calendar_bot.caches.clear()
+    calendar_bot.caches.loaded = False
+    calendar_bot.views.invalidate()
+    if use_cache:
+        await calendar_bot.load_cache()
+
+'''
+    Benchmark cases: (name, coroutine function called with (ctx, i) for the i-th iteration)
+'''
+def bench_date(i):
+    return (date.today() + timedelta(days=1 + i % 365)).strftime('%m/%d/%Y')
+
+# Cases of one calendar; reminders are (guild_id, event, lead_minutes) sent together as one burst
+def make_cases(reminders):
+    return [
+        ('add_event', lambda ctx, i: calendar_bot.add_event(ctx, f'Bench {i}', bench_date(i), '10:30AM', 'Bench room', 'bencher')),
+        ('update_event', lambda ctx, i: calendar_bot.update_event(ctx, f'Bench {i}', 'location=Other room')),
+        ('calendar -w', lambda ctx, i: calendar_bot.calendar(ctx, '-w')),
+        ('calendar -m', lambda ctx, i: calendar_bot.calendar(ctx, '-m')),
+        ('calendar -a', lambda ctx, i: calendar_bot.calendar(ctx, '-a')),
+        ('todo', lambda ctx, i: calendar_bot.todo(ctx, f'contact{i % CONTACTS}')),
+        ('delete_event', lambda ctx, i: calendar_bot.delete_event(ctx, f'Bench {i}')),
+        ('check_reminders', lambda ctx, i: calendar_bot.check_reminders(reminders)),
+    ]
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+# Time iterations [0, iterations) of a case, then trace memory of [iterations, iterations + memory_iterations)
+async def run_case(ctx, monitor, fn, iterations, memory_iterations):
+    errors = len(ctx.channel.errors)
+    latencies = []
+    monitor.reset()
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        await fn(ctx, i)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    blocked, max_stall = monitor.blocked, monitor.max_stall
+
+    peak = 0
+    tracemalloc.start()
+    for i in range(iterations, iterations + memory_iterations):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await fn(ctx, i)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    return {
+        'throughput': iterations / elapsed,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'peak': peak,
+        'blocked': blocked,
+        'max_stall': max_stall,
+        # Error replies, which would otherwise be timed as if the command had succeeded
+        'errors': ctx.channel.errors[errors:],
+    }
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark bot commands against synthetic calendars.')
+    parser.add_argument('--sizes', default='1000,100000,1000000', help='comma separated numbers of events to seed')
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per command')
+    parser.add_argument('--memory-iterations', type=int, default=5, help='calls per command traced for peak memory')
+    parser.add_argument('--db-dir', default=tempfile.gettempdir(), help='directory of the seeded databases (reused across runs)')
+    parser.add_argument('--no-cache', action='store_true', help='serve reads from database instead of the in-memory & rendered view caches')
+    args = parser.parse_args(argv)
+
+    guild = StubGuild(GUILD_ID)
+    ctx = StubContext(guild)
+    stub_bot(guild)
+    if args.no_cache:
+        # Compute every calendar instead of serving repeats from the rendered view cache
+        calendar_bot.views.ttl = 0
+    monitor = LoopMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+    failed = []
+
+    try:
+        for n in (int(size) for size in args.sizes.split(',')):
+            storage, seed_seconds = await open_database(args.db_dir, n)
+            start = time.perf_counter()
+            await use_storage(storage, not args.no_cache)
+            load_seconds = time.perf_counter() - start
+            upcoming = await storage.get_upcoming_events(GUILD_ID, date.today(), date.today() + timedelta(days=7))
+            reminders = [(GUILD_ID, event, 60) for event in upcoming[:REMINDER_BURST]]
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+            print(f'\n{n} events (seeded in {seed_seconds:.1f}s, loaded in {load_seconds:.2f}s, peak RSS {rss:.0f} MiB, {"database" if args.no_cache else "cache"} reads)')
+            print(f'{"command":<16}{"ops/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"peak KiB":>11}{"blocked ms":>12}{"max stall ms":>14}{"errors":>8}')
+            for name, fn in make_cases(reminders):
+                result = await run_case(ctx, monitor, fn, args.iterations, args.memory_iterations)
+                print(
+                    f'{name:<16}{result["throughput"]:>10.1f}{result["p50"] * 1000:>10.3f}{result["p99"] * 1000:>10.3f}'
+                    f'{result["peak"] / 1024:>11.1f}{result["blocked"] * 1000:>12.1f}{result["max_stall"] * 1000:>14.1f}{len(result["errors"]):>8}'
+                )
+                if result['errors']:
+                    failed.append((n, name, result['errors']))
+            # Let calendar paging tasks finish before switching database
+            await asyncio.gather(*calendar_bot.paging_tasks)
+    finally:
+        monitor_task.cancel()
+        await calendar_bot.storage.close()
+
+    # Timings of a failing command measure its error path, so the run fails
+    for n, name, errors in failed:
+        print(f'{name} replied with {len(errors)} error(s) at {n} events, e.g.: {errors[0]}', file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
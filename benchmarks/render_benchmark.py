@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from render import paginate_events
+
+'''
+    Benchmark calendar rendering: time & allocations to render pages of 10k events
+    Usage: python benchmarks/render_benchmark.py [num_events]
+'''
+# Build synthetic event rows sorted by date
+def make_events(n):
+    start = date.today()
+    return [
+        (f'Event {i}', str(start + timedelta(days=i // 50)), f'{i % 12 + 1}:{i % 60:02d} PM', f'Room {i % 300}', f'contact{i % 97}')
+        for i in range(n)
+    ]
+
+# Render one page, returning (seconds, allocated blocks, peak bytes, has_next)
+def measure(events, page):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    fields, has_next = paginate_events(events, page, 'Calendar - Benchmark')
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return elapsed, blocks, peak, has_next
+
+# Count pages by rendering until the last one
+def count_pages(events):
+    page = 1
+    while paginate_events(events, page)[1]:
+        page += 1
+    return page
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    events = make_events(n)
+    last_page = count_pages(events)
+    print(f'{n} events -> {last_page} page(s)')
+    print(f'{"page":>6} {"time (ms)":>10} {"alloc blocks":>13} {"peak (KiB)":>11}')
+    for page in sorted({1, 2, last_page // 2 or 1, last_page}):
+        elapsed, blocks, peak, _ = measure(events, page)
+        print(f'{page:>6} {elapsed * 1000:>10.3f} {blocks:>13} {peak / 1024:>11.1f}')
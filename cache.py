@@ -0,0 +1,322 @@
+import json
+import os
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime, timedelta
+from heapq import merge
+from itertools import count
+
+from storage import event_timestamp, name_key, day_bounds
+from recurrence import Series, parse_day
+
+# How far ahead recurring events are expanded when listing the whole calendar
+SERIES_HORIZON_DAYS = 365
+# Most completions returned for one prefix (Discord shows at most 25 autocomplete choices)
+MAX_COMPLETIONS = 25
+
+'''
+    Prefix index: case-folded keys in a sorted array, so completing a prefix is a binary search
+    plus a walk over the matches; each key keeps the spelling it was first added with & a count
+    of how many events share it.
+'''
+class PrefixIndex:
+    def __init__(self):
+        self._keys = []
+        # key -> [value as first spelled, number of events]
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, value):
+        key = name_key(value)
+        entry = self._entries.get(key)
+        if entry:
+            entry[1] += 1
+        else:
+            self._entries[key] = [value, 1]
+            insort(self._keys, key)
+
+    def discard(self, value):
+        key = name_key(value)
+        entry = self._entries.get(key)
+        if not entry:
+            return
+        entry[1] -= 1
+        if not entry[1]:
+            del self._entries[key]
+            self._keys.pop(bisect_left(self._keys, key))
+
+    # Build the index from many values at once: one sort instead of an insort per value
+    def load(self, values):
+        self.clear()
+        for value in values:
+            key = name_key(value)
+            entry = self._entries.get(key)
+            if entry:
+                entry[1] += 1
+            else:
+                self._entries[key] = [value, 1]
+        self._keys = sorted(self._entries)
+
+    def clear(self):
+        self._keys = []
+        self._entries.clear()
+
+    # Values starting with a prefix (case-insensitive), in alphabetical order
+    def complete(self, prefix, limit=MAX_COMPLETIONS):
+        prefix = name_key(prefix)
+        matches = []
+        for i in range(bisect_left(self._keys, prefix), len(self._keys)):
+            if len(matches) >= limit or not self._keys[i].startswith(prefix):
+                break
+            matches.append(self._entries[self._keys[i]][0])
+        return matches
+
+'''
+    In-memory calendar index: a timeline sorted by event datetime plus a name dictionary,
+    kept in sync write-through by the bot's mutating commands. Rows are the five columns the bot
+    unpacks; each event's optional end time is kept next to its row.
+'''
+class EventCache:
+    def __init__(self):
+        self._seq = count()
+        # Timeline entries are (event_at, seq, row, end_time); seq keeps entries unique & ordered by insertion
+        self._timeline = []
+        self._by_name = {}
+        # Names & contacts of events and series, for autocomplete
+        self.names = PrefixIndex()
+        self.contacts = PrefixIndex()
+        # Recurring events by case-folded name, expanded only inside requested windows
+        self.series = {}
+        self.loaded = False
+
+    # Number of one-off events & recurring series on record
+    def __len__(self):
+        return len(self._timeline) + len(self.series)
+
+    # Replace the cache contents with the given rows (event_name, event_date, event_time, location, contact[, end_time])
+    def load(self, rows):
+        self.clear()
+        for row in rows:
+            self._insert(row[:5], row[5] if len(row) > 5 else None)
+        self.names.load(entry[2][0] for entry in self._timeline)
+        self.contacts.load(entry[2][4] for entry in self._timeline)
+        self.loaded = True
+
+    # Normalize a row to the strings stored in database & index it
+    def add(self, row, end_time=None):
+        row = self._insert(row, end_time)
+        self.names.add(row[0])
+        self.contacts.add(row[4])
+
+    def _insert(self, row, end_time=None):
+        row = tuple(str(field) for field in row)
+        entry = (event_timestamp(row[1], row[2]), next(self._seq), row, end_time)
+        insort(self._timeline, entry)
+        self._by_name.setdefault(name_key(row[0]), []).append(entry)
+        return row
+
+    def _unlink(self, entry):
+        self._timeline.pop(bisect_left(self._timeline, entry))
+        self.names.discard(entry[2][0])
+        self.contacts.discard(entry[2][4])
+        key = name_key(entry[2][0])
+        entries = self._by_name.get(key, [])
+        if entry in entries:
+            entries.remove(entry)
+        if not entries:
+            self._by_name.pop(key, None)
+
+    # Remove every event with the given name (case-insensitive), returning number removed
+    def remove(self, event_name):
+        entries = list(self._by_name.get(name_key(event_name), []))
+        for entry in entries:
+            self._unlink(entry)
+        return len(entries)
+
+    def replace(self, old_name, row, end_time=None):
+        if self.remove(old_name):
+            self.add(row, end_time)
+
+    # Remove every event on a day before the given date & every series that ended before it
+    def remove_before(self, day):
+        cut = bisect_left(self._timeline, (str(day),))
+        for entry in self._timeline[:cut]:
+            self._unlink(entry)
+        for key in [key for key, series in self.series.items() if (series.last_date() or str(day)) < str(day)]:
+            self._unindex_series(self.series.pop(key))
+        return cut
+
+    def clear(self):
+        self._timeline.clear()
+        self._by_name.clear()
+        self.series.clear()
+        self.names.clear()
+        self.contacts.clear()
+
+    def add_series(self, series):
+        if series.key in self.series:
+            self._unindex_series(self.series[series.key])
+        self.series[series.key] = series
+        self.names.add(series.event_name)
+        self.contacts.add(series.contact)
+
+    def remove_series(self, event_name):
+        series = self.series.pop(name_key(event_name), None)
+        if series:
+            self._unindex_series(series)
+        return series
+
+    def _unindex_series(self, series):
+        self.names.discard(series.event_name)
+        self.contacts.discard(series.contact)
+
+    def get_series(self, event_name):
+        return self.series.get(name_key(event_name))
+
+    '''
+        Queries
+    '''
+    # One-off events only, without series occurrences
+    def get_one_off_events(self):
+        return [entry[2] for entry in self._timeline]
+
+    # One-off events on or after a day, without series occurrences
+    def get_events_from(self, day):
+        return [entry[2] for entry in self._timeline[bisect_left(self._timeline, (str(day),)):]]
+
+    # One-off events on or after a day with their end times, as (event_name, ..., contact, end_time) rows
+    def get_rows_from(self, day):
+        return [(*entry[2], entry[3]) for entry in self._timeline[bisect_left(self._timeline, (str(day),)):]]
+
+    # One-off events (all of them) merged with series occurrences from today up to the horizon
+    def get_all_events(self):
+        events = [entry[2] for entry in self._timeline]
+        if not self.series:
+            return events
+        today = date.today()
+        return self._merge_occurrences(events, today, today + timedelta(days=SERIES_HORIZON_DAYS))
+
+    # Binary search both ends of the day range: O(log n + k), plus series occurrences inside the range
+    def get_upcoming_events(self, start, end):
+        low, high = day_bounds(start, end)
+        events = [entry[2] for entry in self._timeline[bisect_left(self._timeline, (low,)):bisect_right(self._timeline, (high, float('inf')))]]
+        if not self.series:
+            return events
+        return self._merge_occurrences(events, parse_day(start), parse_day(end))
+
+    # Merge sorted one-off events with occurrences of every series between start & end
+    def _merge_occurrences(self, events, start, end):
+        occurrences = sorted(
+            (event_timestamp(row[1], row[2]), row)
+            for series in self.series.values() for row in series.occurrences(start, end)
+        )
+        return list(merge(events, (row for _, row in occurrences), key=lambda row: event_timestamp(row[1], row[2])))
+
+    # One-off events of a day range with their end times, optionally of one contact (case-insensitive), like
+    # the database's get_busy_events; series occurrences are left to the caller
+    def get_busy_events(self, start, end, contact=None):
+        low, high = day_bounds(start, end)
+        entries = self._timeline[bisect_left(self._timeline, (low,)):bisect_right(self._timeline, (high, float('inf')))]
+        return [(*entry[2], entry[3]) for entry in entries if not contact or name_key(entry[2][4]) == name_key(contact)]
+
+    # End time of the one-off event with the given name, or None (also for series, which have none)
+    def get_end_time(self, event_name):
+        entries = self._by_name.get(name_key(event_name))
+        return entries[0][3] if entries else None
+
+    # Number of one-off events, as the database counts them (series are kept in their own table)
+    def count_one_off_events(self):
+        return len(self._timeline)
+
+    def count_events_on(self, day):
+        return len(self.get_upcoming_events(day, day))
+
+    # One-off event with the given name, else the next occurrence of a series with that name
+    def search_event(self, event_name):
+        entries = self._by_name.get(name_key(event_name))
+        if entries:
+            return entries[0][2]
+        series = self.get_series(event_name)
+        if series:
+            return series.next_after(datetime.now()) or next(series.occurrences(), None)
+
+    # Event (or series occurrence) with the given name starting at event_at ('YYYY-MM-DD HH:MM'), or None
+    def find_occurrence(self, event_name, event_at):
+        for entry in self._by_name.get(name_key(event_name), []):
+            if entry[0] == event_at:
+                return entry[2]
+        series = self.get_series(event_name)
+        if series and series.occurs_on(event_at[:10]):
+            row = series.occurrence(event_at[:10])
+            if event_timestamp(row[1], row[2]) == event_at:
+                return row
+
+    # Compare the cache against database rows (event_name, ..., contact, end_time), returning (missing from cache, stale in cache)
+    def diff(self, rows):
+        cached = {}
+        for _, _, row, end_time in self._timeline:
+            cached[(*row, end_time)] = cached.get((*row, end_time), 0) + 1
+        for row in rows:
+            row = (*(str(field) for field in row[:5]), row[5])
+            cached[row] = cached.get(row, 0) - 1
+        missing = [row for row, n in cached.items() if n < 0]
+        stale = [row for row, n in cached.items() if n > 0]
+        return missing, stale
+
+'''
+    One EventCache per guild, created on first use
+'''
+class GuildCaches(dict):
+    def __init__(self):
+        super().__init__()
+        self.loaded = False
+
+    # New guilds start with an empty calendar, already complete once every guild was loaded
+    def __missing__(self, guild_id):
+        cache = self[guild_id] = EventCache()
+        cache.loaded = self.loaded
+        return cache
+
+    # Replace every guild's cache given (guild_id, event_name, ...) event & series rows
+    def load(self, rows, series_rows=()):
+        self.clear()
+        grouped = {}
+        for guild_id, *row in rows:
+            grouped.setdefault(guild_id, []).append(row)
+        for guild_id, guild_rows in grouped.items():
+            self[guild_id].load(guild_rows)
+        for guild_id, *row in series_rows:
+            self[guild_id].add_series(Series.from_row(row))
+        self.loaded = True
+        for cache in self.values():
+            cache.loaded = True
+
+    def total(self):
+        return sum(len(cache) for cache in self.values())
+
+    # Upcoming one-off events & every series of every guild as a JSON-serializable snapshot
+    def snapshot(self):
+        today = date.today()
+        return {
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'events': [[guild_id, *row] for guild_id, cache in self.items() for row in cache.get_rows_from(today)],
+            'series': [[guild_id, *series.to_row()[:10]] for guild_id, cache in self.items() for series in cache.series.values()],
+        }
+
+    # Load a snapshot, keeping only the guilds for which owns(guild_id) is true
+    def load_snapshot(self, snapshot, owns=lambda guild_id: True):
+        self.load((row for row in snapshot['events'] if owns(row[0])), (row for row in snapshot['series'] if owns(row[0])))
+
+'''
+    Snapshot files, read & written off the event loop (e.g. with asyncio.to_thread)
+'''
+def read_snapshot(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# Write to a temporary file first so a crash never leaves a truncated snapshot behind
+def write_snapshot(path, snapshot):
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(f'{path}.tmp', path)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from storage import event_timestamp, name_key
+from recurrence import parse_day
+
+# Length of events saved without an end time
+DEFAULT_DURATION_MINUTES = 60
+# Hours of the day searched for free slots
+FREE_DAY_START = 8
+FREE_DAY_END = 22
+# Shortest gap reported as a free slot
+MIN_FREE_MINUTES = 30
+
+'''
+    Double-booking & free-slot detection: one sorted sweep over the busy intervals of a date range
+'''
+def parse_timestamp(event_at):
+    return datetime.strptime(event_at, '%Y-%m-%d %H:%M')
+
+# Busy interval (start, end, row) of an event row (event_name, event_date, event_time, location, contact)
+# given its optional end time; events without one (or ending before they start) last DEFAULT_DURATION_MINUTES
+def event_interval(row, end_time=None):
+    start = parse_timestamp(event_timestamp(row[1], row[2]))
+    end = parse_timestamp(event_timestamp(row[1], end_time)) if end_time else None
+    if not end or end <= start:
+        end = start + timedelta(minutes=DEFAULT_DURATION_MINUTES)
+    return start, end, row
+
+# Events overlapping [start, end) that share the contact or the location (case-insensitive).
+# Intervals must be sorted by start; the sweep stops at the first one starting after end.
+def find_conflicts(intervals, start, end, contact=None, location=None, exclude=None):
+    contact, location, exclude = (name_key(value) if value else None for value in (contact, location, exclude))
+    conflicts = []
+    for busy_start, busy_end, row in intervals:
+        if busy_start >= end:
+            break
+        if busy_end <= start or (exclude and name_key(row[0]) == exclude):
+            continue
+        if (contact and name_key(row[4]) == contact) or (location and name_key(row[3]) == location):
+            conflicts.append(row)
+    return conflicts
+
+# Open (start, end) slots between day_start & day_end o'clock of every day from start to end (inclusive),
+# given busy intervals sorted by start
+def free_slots(intervals, start, end, day_start=FREE_DAY_START, day_end=FREE_DAY_END, min_minutes=MIN_FREE_MINUTES):
+    slots = []
+    intervals = iter(intervals)
+    busy = next(intervals, None)
+    day = parse_day(start)
+    while day <= parse_day(end):
+        cursor = datetime(day.year, day.month, day.day, day_start)
+        closing = datetime(day.year, day.month, day.day, day_end)
+        # Walk the intervals touching this day, moving the cursor past each one
+        while busy and busy[0] < closing:
+            if busy[0] - cursor >= timedelta(minutes=min_minutes):
+                slots.append((cursor, busy[0]))
+            cursor = max(cursor, busy[1])
+            if busy[1] > closing:
+                break
+            busy = next(intervals, None)
+        if closing - cursor >= timedelta(minutes=min_minutes):
+            slots.append((cursor, closing))
+        day += timedelta(days=1)
+    return slots
+
+# Describe an interval, e.g. '9:00 AM-10:30 AM'
+def describe_interval(start, end):
+    return f"{start.strftime('%I:%M %p').lstrip('0')}-{end.strftime('%I:%M %p').lstrip('0')}"
@@ -0,0 +1,130 @@
+import calendar
+import io
+from datetime import date, datetime, timedelta
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+'''
+    Calendar images (PNG) drawn with Pillow, an optional dependency. Drawing is CPU-bound, so the bot runs
+    these functions in a process pool: they are module-level, take plain rows & return bytes.
+'''
+# Layout of a month grid & of a week agenda, in pixels
+CELL_WIDTH = 180
+CELL_HEIGHT = 120
+DAY_WIDTH = 220
+TITLE_HEIGHT = 48
+WEEKDAY_HEIGHT = 28
+LINE_HEIGHT = 16
+PADDING = 6
+# Lines of events listed under each day of the week agenda before '+n more' (fewest & most)
+MIN_AGENDA_LINES = 6
+AGENDA_LINES = 24
+
+BACKGROUND = (255, 255, 255)
+GRID = (200, 204, 214)
+TEXT = (32, 34, 37)
+MUTED = (150, 153, 160)
+ACCENT = (115, 138, 219)
+TODAY = (232, 237, 252)
+OVERDUE = (255, 0, 0)
+
+def available():
+    return Image is not None
+
+# Pillow >= 10.1 scales its built-in font; older versions only have the small bitmap one
+def load_font(size):
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+# Cut text with an ellipsis so it fits in width pixels
+def fit_text(draw, text, font, width):
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + '…', font=font) > width:
+        text = text[:-1]
+    return text + '…'
+
+# Group event rows (event_name, event_date, event_time, location, contact), sorted by date & time, by date
+def events_by_day(events):
+    days = {}
+    for event in events:
+        days.setdefault(str(event[1]), []).append(event)
+    return days
+
+def to_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+# Month grid with weeks starting on Monday; each day lists its events' times & names until it is full
+def render_month(title, year, month, events, today=None):
+    today = str(today or date.today())
+    weeks = calendar.Calendar(firstweekday=calendar.MONDAY).monthdatescalendar(year, month)
+    image = Image.new('RGB', (7 * CELL_WIDTH + 1, TITLE_HEIGHT + WEEKDAY_HEIGHT + len(weeks) * CELL_HEIGHT + 1), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    title_font, font, small_font = load_font(24), load_font(14), load_font(12)
+    draw.text((PADDING * 2, (TITLE_HEIGHT - 24) // 2), title, font=title_font, fill=ACCENT)
+    for i, name in enumerate(calendar.day_abbr):
+        draw.text((i * CELL_WIDTH + PADDING, TITLE_HEIGHT + PADDING), name, font=font, fill=MUTED)
+
+    days = events_by_day(events)
+    lines = (CELL_HEIGHT - LINE_HEIGHT - 2 * PADDING) // LINE_HEIGHT
+    for row, week in enumerate(weeks):
+        for column, day in enumerate(week):
+            x, y = column * CELL_WIDTH, TITLE_HEIGHT + WEEKDAY_HEIGHT + row * CELL_HEIGHT
+            draw.rectangle((x, y, x + CELL_WIDTH, y + CELL_HEIGHT), fill=TODAY if str(day) == today else BACKGROUND, outline=GRID)
+            draw.text((x + PADDING, y + PADDING), str(day.day), font=font, fill=TEXT if day.month == month else MUTED)
+            if day.month != month:
+                continue
+
+            day_events = days.get(str(day), [])
+            shown = day_events if len(day_events) <= lines else day_events[:lines - 1]
+            for i, event in enumerate(shown):
+                text = fit_text(draw, f'{event[2]} {event[0]}', small_font, CELL_WIDTH - 2 * PADDING)
+                draw.text((x + PADDING, y + PADDING + (i + 1) * LINE_HEIGHT), text, font=small_font, fill=TEXT)
+            if len(shown) < len(day_events):
+                draw.text((x + PADDING, y + PADDING + lines * LINE_HEIGHT), f'+{len(day_events) - len(shown)} more', font=small_font, fill=ACCENT)
+    return to_png(image)
+
+# Week agenda from start (a date): one column per day listing its events, then the open tasks due by the
+# end of the week (task_name, task_deadline, status, contact), overdue ones in red
+def render_week_digest(title, start, events, tasks, today=None):
+    today = str(today or date.today())
+    start = start if isinstance(start, date) else datetime.strptime(str(start), '%Y-%m-%d').date()
+    days = events_by_day(events)
+    # Columns are as tall as the busiest day needs
+    lines = max(MIN_AGENDA_LINES, min(AGENDA_LINES, max(map(len, days.values()), default=0)))
+    task_lines = min(len(tasks), AGENDA_LINES)
+    height = TITLE_HEIGHT + WEEKDAY_HEIGHT + lines * LINE_HEIGHT + 2 * PADDING
+    tasks_top = height + PADDING
+    if tasks:
+        height += (task_lines + 2) * LINE_HEIGHT + 2 * PADDING
+    image = Image.new('RGB', (7 * DAY_WIDTH + 1, height + 1), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    title_font, font, small_font = load_font(24), load_font(14), load_font(12)
+    draw.text((PADDING * 2, (TITLE_HEIGHT - 24) // 2), title, font=title_font, fill=ACCENT)
+
+    for column in range(7):
+        day = start + timedelta(days=column)
+        x, y = column * DAY_WIDTH, TITLE_HEIGHT
+        draw.rectangle((x, y, x + DAY_WIDTH, tasks_top - PADDING), fill=TODAY if str(day) == today else BACKGROUND, outline=GRID)
+        draw.text((x + PADDING, y + PADDING), day.strftime('%a %m/%d'), font=font, fill=TEXT)
+        day_events = days.get(str(day), [])
+        shown = day_events if len(day_events) <= lines else day_events[:lines - 1]
+        for i, event in enumerate(shown):
+            text = fit_text(draw, f'{event[2]} {event[0]} ({event[4]})', small_font, DAY_WIDTH - 2 * PADDING)
+            draw.text((x + PADDING, y + WEEKDAY_HEIGHT + i * LINE_HEIGHT), text, font=small_font, fill=TEXT)
+        if len(shown) < len(day_events):
+            draw.text((x + PADDING, y + WEEKDAY_HEIGHT + len(shown) * LINE_HEIGHT), f'+{len(day_events) - len(shown)} more', font=small_font, fill=ACCENT)
+
+    if tasks:
+        draw.text((PADDING * 2, tasks_top), f'Open tasks due this week ({len(tasks)})', font=font, fill=TEXT)
+        for i, (task_name, task_deadline, _, contact) in enumerate(tasks[:task_lines]):
+            text = f'{task_deadline}  {task_name} - {contact}' if i < task_lines - 1 or len(tasks) == task_lines else f'+{len(tasks) - i} more'
+            draw.text((PADDING * 2, tasks_top + (i + 1) * LINE_HEIGHT + PADDING), fit_text(draw, text, small_font, 7 * DAY_WIDTH - 4 * PADDING), font=small_font, fill=OVERDUE if task_deadline < today else TEXT)
+    return to_png(image)
@@ -0,0 +1,179 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import time
+from bisect import bisect_left
+
+'''
+    Low-overhead metrics (counters & fixed-bucket latency histograms), structured JSON logging
+    & an optional local Prometheus-style text endpoint
+'''
+# Upper bounds (seconds) of latency histogram buckets; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Name of the bot command running in the current task, used to attribute errors & database work
+current_command = contextvars.ContextVar('current_command', default=None)
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # Estimate a quantile as the upper bound of the bucket it falls in
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return BUCKETS[i] if i < len(BUCKETS) else float('inf')
+        return float('inf')
+
+# Metrics are only updated from the event loop thread, so no locking is needed
+class Metrics:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    # Decorate a coroutine function to record its latency & errors under the given metric name
+    def timed(self, name, **labels):
+        def decorator(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    self.inc(f'{name}_errors_total', **labels)
+                    raise
+                finally:
+                    self.observe(f'{name}_seconds', time.perf_counter() - start, **labels)
+            return wrapper
+        return decorator
+
+    # Rows of (label value, calls, p50, p99, total seconds) of one histogram, grouped by a label
+    def summary(self, name, label):
+        rows = []
+        for (metric, labels), histogram in sorted(self.histograms.items()):
+            if metric == name:
+                rows.append((dict(labels).get(label, ''), histogram.count, histogram.quantile(0.5), histogram.quantile(0.99), histogram.sum))
+        return rows
+
+    # Total of a counter per value of a label
+    def totals(self, name, label):
+        totals = {}
+        for (metric, labels), value in self.counters.items():
+            if metric == name:
+                key = dict(labels).get(label, '')
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    # Render every metric in Prometheus text exposition format
+    def render_prometheus(self):
+        def format_labels(labels, extra=()):
+            pairs = [f'{key}="{str(value)}"'.replace('\n', ' ') for key, value in (*labels, *extra)]
+            return '{' + ','.join(pairs) + '}' if pairs else ''
+
+        lines, typed = [], set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, n in zip((*BUCKETS, '+Inf'), histogram.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{format_labels(labels, (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+            lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+'''
+    Structured logging
+'''
+# Format log records as one JSON object per line, including the running command & any `extra` fields
+class JsonFormatter(logging.Formatter):
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if current_command.get():
+            entry['command'] = current_command.get()
+        entry.update({key: value for key, value in vars(record).items() if key not in self.RESERVED})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+# Count logged errors by the command that was running when they happened
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record):
+        metrics.inc('calendar_errors_total', command=current_command.get() or 'background')
+
+def configure_logging(level='INFO'):
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(handler)
+    root.addHandler(ErrorCounter())
+
+'''
+    Prometheus-style text endpoint, only meant to be bound to localhost
+'''
+async def handle_metrics_request(reader, writer):
+    try:
+        request_line = await reader.readline()
+        # Drain request headers
+        while (await reader.readline()).strip():
+            pass
+        if request_line.split()[1:2] == [b'/metrics']:
+            status, body = '200 OK', metrics.render_prometheus().encode()
+        else:
+            status, body = '404 Not Found', b'Not Found\n'
+        writer.write(
+            f'HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logging.getLogger(__name__).warning('Error: %s', e)
+    finally:
+        writer.close()
+
+async def serve_metrics(port, host='127.0.0.1'):
+    return await asyncio.start_server(handle_metrics_request, host, port)
@@ -0,0 +1,280 @@
+import asyncio
+import functools
+import time
+from datetime import date, datetime
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from instrumentation import metrics
+from storage import BaseStorage, EVENT_COLUMNS, ALL_GUILD_EVENTS, ALL_GUILD_SERIES, ARCHIVE_BATCH_SIZE, instrumented
+
+# Connections kept open & most opened at once per bot process
+DEFAULT_POOL_MIN = 2
+DEFAULT_POOL_MAX = 10
+# Prepared statements kept per connection; the bot runs a few dozen distinct queries
+STATEMENT_CACHE_SIZE = 256
+# Key of the advisory lock held while migrating, so processes starting together migrate one at a time
+MIGRATION_LOCK = 0x63616c
+
+'''
+    Schema migrations, applied in order & tracked in the calendar_schema table.
+    Version 1 is the schema SQLite databases reach through their own migrations.
+'''
+SCHEMA = (
+    '''
+    CREATE TABLE events (
+        event_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        event_name TEXT,
+        event_date TEXT,
+        event_time TEXT,
+        location TEXT,
+        contact TEXT,
+        event_at TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        end_time TEXT
+    )
+    ''',
+    'CREATE INDEX idx_events_event_at ON events (event_at)',
+    'CREATE INDEX idx_events_guild_event_at ON events (guild_id, event_at)',
+    'CREATE INDEX idx_events_guild_name_key ON events (guild_id, name_key)',
+    '''
+    CREATE TABLE reminders_sent (
+        guild_id BIGINT NOT NULL,
+        name_key TEXT NOT NULL,
+        event_at TEXT NOT NULL,
+        lead_minutes INTEGER NOT NULL,
+        sent_at TEXT NOT NULL,
+        PRIMARY KEY (guild_id, name_key, event_at, lead_minutes)
+    )
+    ''',
+    '''
+    CREATE TABLE event_series (
+        series_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        event_name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        event_time TEXT NOT NULL,
+        location TEXT,
+        contact TEXT,
+        freq TEXT NOT NULL,
+        "interval" INTEGER NOT NULL DEFAULT 1,
+        "count" INTEGER,
+        until TEXT,
+        exceptions TEXT NOT NULL DEFAULT '',
+        last_date TEXT
+    )
+    ''',
+    'CREATE INDEX idx_event_series_guild_name_key ON event_series (guild_id, name_key)',
+    'CREATE INDEX idx_event_series_last_date ON event_series (last_date)',
+    '''
+    CREATE TABLE todos (
+        task_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        task_name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        task_deadline TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'open',
+        contact TEXT NOT NULL,
+        contact_key TEXT NOT NULL,
+        completed_at TEXT
+    )
+    ''',
+    'CREATE INDEX idx_todos_guild_contact_status_deadline ON todos (guild_id, contact_key, status, task_deadline)',
+    'CREATE INDEX idx_todos_guild_status_deadline ON todos (guild_id, status, task_deadline)',
+    'CREATE INDEX idx_todos_guild_name_key ON todos (guild_id, name_key)',
+    '''
+    CREATE TABLE events_archive (
+        archive_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+        guild_id BIGINT NOT NULL,
+        event_name TEXT,
+        event_date TEXT,
+        event_time TEXT,
+        location TEXT,
+        contact TEXT,
+        event_at TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        end_time TEXT,
+        archived_at TEXT NOT NULL
+    )
+    ''',
+    'CREATE INDEX idx_events_archive_guild_event_at ON events_archive (guild_id, event_at)',
+    'CREATE INDEX idx_events_archive_event_at ON events_archive (event_at)',
+)
+
+MIGRATIONS = [
+    SCHEMA,
+]
+
+# Rewrite '?' placeholders as PostgreSQL's numbered '$1', '$2', …, leaving quoted text alone.
+# Cached, so each distinct query is only rewritten once.
+@functools.lru_cache(maxsize=None)
+def numbered(query):
+    parts, n, quoted = [], 0, None
+    for char in query:
+        if quoted:
+            quoted = None if char == quoted else quoted
+        elif char in ('"', "'"):
+            quoted = char
+        elif char == '?':
+            n += 1
+            char = f'${n}'
+        parts.append(char)
+    return ''.join(parts)
+
+# Dates are stored as ISO text, as SQLite's default adapters store them
+def adapt(params):
+    return [str(param) if isinstance(param, date) else param for param in params]
+
+# Number of rows a command status like 'DELETE 3' or 'INSERT 0 1' reports
+def status_rowcount(status):
+    try:
+        return int(status.rsplit(' ', 1)[-1])
+    except (AttributeError, ValueError):
+        return -1
+
+'''
+    PostgreSQL backend: a pool of connections shared by the coroutines of one bot process, so several bot
+    processes (e.g. one per set of shards) can share one database. Queries go through asyncpg's per-connection
+    prepared statement cache; each write is its own transaction. Checked against a server by benchmarks/storage_smoke.py.
+    pool: an already created asyncpg pool to share, else one is created on open().
+'''
+class PostgresStorage(BaseStorage):
+    LIKE = 'ILIKE'
+    NO_LIMIT = None
+
+    def __init__(self, dsn, min_size=DEFAULT_POOL_MIN, max_size=DEFAULT_POOL_MAX, pool=None):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool = pool
+        # Task creating the pool & migrating, started by open()
+        self._opening = None
+
+    def open(self):
+        if self._opening is None:
+            self._opening = asyncio.ensure_future(self._connect())
+        return self._opening
+
+    async def _connect(self):
+        if self.pool is None:
+            if asyncpg is None:
+                raise RuntimeError('PostgreSQL storage needs asyncpg to be installed (`pip install asyncpg`).')
+            self.pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size, statement_cache_size=STATEMENT_CACHE_SIZE
+            )
+        async with self.pool.acquire() as connection:
+            await self._migrate(connection)
+
+    # Apply every migration newer than the database's schema version in one transaction
+    async def _migrate(self, connection):
+        async with connection.transaction():
+            await connection.execute('SELECT pg_advisory_xact_lock($1)', MIGRATION_LOCK)
+            await connection.execute('CREATE TABLE IF NOT EXISTS calendar_schema (version INTEGER NOT NULL)')
+            version = await connection.fetchval('SELECT version FROM calendar_schema')
+            if version is None:
+                version = 0
+                await connection.execute('INSERT INTO calendar_schema (version) VALUES (0)')
+            for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in migration:
+                    await connection.execute(statement)
+                await connection.execute('UPDATE calendar_schema SET version=$1', i)
+
+    # Borrow a connection once the database is open, timing how long the pool kept the caller waiting
+    async def acquire(self):
+        # Raises here if opening the database failed
+        await self.open()
+        start = time.perf_counter()
+        connection = await self.pool.acquire()
+        metrics.observe('calendar_db_pool_wait_seconds', time.perf_counter() - start)
+        return connection
+
+    async def fetchall(self, query, params=()):
+        connection = await self.acquire()
+        try:
+            return [tuple(row) for row in await connection.fetch(numbered(query), *adapt(params))]
+        finally:
+            await self.pool.release(connection)
+
+    async def fetchone(self, query, params=()):
+        connection = await self.acquire()
+        try:
+            row = await connection.fetchrow(numbered(query), *adapt(params))
+            return tuple(row) if row is not None else None
+        finally:
+            await self.pool.release(connection)
+
+    async def write(self, *statements):
+        connection = await self.acquire()
+        try:
+            async with connection.transaction():
+                for query, params in statements:
+                    status = await connection.execute(numbered(query), *adapt(params))
+        finally:
+            await self.pool.release(connection)
+        metrics.inc('calendar_db_commits_total')
+        return status_rowcount(status)
+
+    async def write_many(self, query, rows):
+        connection = await self.acquire()
+        try:
+            async with connection.transaction():
+                await connection.executemany(numbered(query), [adapt(row) for row in rows])
+        finally:
+            await self.pool.release(connection)
+        metrics.inc('calendar_db_commits_total')
+        return len(rows)
+
+    # Both reads see the same snapshot of the database
+    @instrumented
+    async def get_all_guild_rows(self):
+        connection = await self.acquire()
+        try:
+            async with connection.transaction(isolation='repeatable_read', readonly=True):
+                events = await connection.fetch(ALL_GUILD_EVENTS)
+                series = await connection.fetch(ALL_GUILD_SERIES)
+        finally:
+            await self.pool.release(connection)
+        return [tuple(row) for row in events], [tuple(row) for row in series]
+
+    # A server-side cursor holds one pooled connection until the last row is read
+    async def iter_events(self, guild_id, batch_size=500):
+        connection = await self.acquire()
+        try:
+            async with connection.transaction(readonly=True):
+                async for row in connection.cursor(numbered(f'SELECT {EVENT_COLUMNS} FROM events WHERE guild_id=? ORDER BY event_at'), guild_id, prefetch=batch_size):
+                    yield tuple(row)
+        finally:
+            await self.pool.release(connection)
+
+    # Counted on the (guild_id, event_at) index; no trigger-maintained counter, which every replica's writes would contend on
+    @instrumented
+    async def count_events(self, guild_id):
+        row = await self.fetchone('SELECT Count(*) FROM events WHERE guild_id=?', (guild_id,))
+        return row[0]
+
+    # Moves a batch in one statement; rows locked by another process archiving at the same time are skipped
+    @instrumented
+    async def archive_events_before(self, day, guild_id=None, limit=ARCHIVE_BATCH_SIZE, archive=True):
+        scope, params = ('guild_id=? AND ', (guild_id, str(day), limit)) if guild_id is not None else ('', (str(day), limit))
+        batch = f'SELECT event_id FROM events WHERE {scope}event_at < ? ORDER BY event_at LIMIT ? FOR UPDATE SKIP LOCKED'
+        if not archive:
+            return await self.write((f'DELETE FROM events WHERE event_id IN ({batch})', params))
+        return await self.write((f'''
+            WITH moved AS (
+                DELETE FROM events WHERE event_id IN ({batch})
+                RETURNING guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time
+            )
+            INSERT INTO events_archive (guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time, archived_at)
+            SELECT guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time, ? FROM moved
+        ''', (*params, datetime.now().strftime('%Y-%m-%d %H:%M'))))
+
+    async def close(self):
+        if self._opening and not self._opening.done():
+            self._opening.cancel()
+        if self.pool:
+            await self.pool.close()
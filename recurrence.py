@@ -0,0 +1,136 @@
+import calendar
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from storage import event_timestamp, name_key
+
+FREQUENCIES = ('daily', 'weekly', 'monthly')
+
+# Parse a 'YYYY-MM-DD' day, clamping days past the end of month (e.g. '2026-02-31' -> Feb 28)
+def parse_day(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    year, month, day = (int(part) for part in str(value)[:10].split('-'))
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+# Add months to a date, returning None when that month has no such day (e.g. Jan 31 + 1 month)
+def add_months(start, months):
+    year, month = divmod(start.month - 1 + months, 12)
+    year, month = start.year + year, month + 1
+    if start.day > calendar.monthrange(year, month)[1]:
+        return None
+    return date(year, month, start.day)
+
+'''
+    A recurring event stored once & expanded lazily into occurrences inside a requested window.
+    Like iCalendar RRULE, excepted dates still count towards count.
+'''
+class Series:
+    def __init__(self, event_name, start_date, event_time, location, contact, freq, interval=1, count=None, until=None, exceptions=()):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}.")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError('interval & count must be positive.')
+        self.event_name = event_name
+        self.start_date = parse_day(start_date)
+        self.event_time = event_time
+        self.location = location
+        self.contact = contact
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = parse_day(until) if until else None
+        self.exceptions = {parse_day(day) for day in exceptions}
+        self.key = name_key(event_name)
+
+    # Build from a database row (event_name, start_date, event_time, location, contact, freq, interval, count, until, exceptions)
+    @classmethod
+    def from_row(cls, row):
+        event_name, start_date, event_time, location, contact, freq, interval, count, until, exceptions = row
+        return cls(event_name, start_date, event_time, location, contact, freq, interval, count, until, [day for day in (exceptions or '').split(',') if day])
+
+    def to_row(self):
+        return (
+            self.event_name, str(self.start_date), self.event_time, self.location, self.contact, self.freq, self.interval,
+            self.count, str(self.until) if self.until else None, ','.join(sorted(str(day) for day in self.exceptions)), self.last_date()
+        )
+
+    # Date of the k-th step from the start (None for skipped monthly steps)
+    def _step(self, k):
+        if self.freq == 'monthly':
+            return add_months(self.start_date, k * self.interval)
+        return self.start_date + timedelta(days=k * self.interval * (7 if self.freq == 'weekly' else 1))
+
+    # Every date of the series in order, including excepted ones, from the start onwards
+    def _all_dates(self, first_step=0):
+        k = first_step
+        while True:
+            day = self._step(k)
+            k += 1
+            if day is None:
+                continue
+            if self.until and day > self.until:
+                return
+            yield day
+
+    # Date of the last occurrence as an ISO string, or None when the series never ends
+    def last_date(self):
+        if self.count is not None:
+            last = None
+            for last in islice(self._all_dates(), self.count):
+                pass
+            return str(last or self.until)
+        return str(self.until) if self.until else None
+
+    # Lazily yield occurrence dates between start & end (inclusive); only steps inside the window are computed
+    def dates(self, start=None, end=None):
+        start = max(parse_day(start), self.start_date) if start else self.start_date
+        end = parse_day(end) if end else None
+
+        if self.freq == 'monthly' or self.count is not None:
+            # Steps are counted from the start so count is respected
+            days = self._all_dates()
+            if self.count is not None:
+                days = islice(days, self.count)
+        else:
+            # Jump straight to the first step inside the window
+            step = self.interval * (7 if self.freq == 'weekly' else 1)
+            days = self._all_dates(max(0, -(-(start - self.start_date).days // step)))
+
+        for day in days:
+            if end and day > end:
+                return
+            if day >= start and day not in self.exceptions:
+                yield day
+
+    def occurs_on(self, day):
+        day = parse_day(day)
+        return next(self.dates(day, day), None) == day
+
+    # Event row of the occurrence on a date, shaped like a one-off event row
+    def occurrence(self, day):
+        return (self.event_name, str(day), self.event_time, self.location, self.contact)
+
+    def occurrences(self, start=None, end=None):
+        return (self.occurrence(day) for day in self.dates(start, end))
+
+    # First occurrence starting strictly after the given datetime, or None
+    def next_after(self, moment):
+        for day in self.dates(moment.date()):
+            row = self.occurrence(day)
+            if datetime.strptime(event_timestamp(row[1], row[2]), '%Y-%m-%d %H:%M') > moment:
+                return row
+
+    # Describe the rule, e.g. 'every 2 weeks until 2026-12-01'
+    def describe(self):
+        unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}[self.freq]
+        text = f'every {unit}' if self.interval == 1 else f'every {self.interval} {unit}s'
+        if self.count is not None:
+            text += f', {self.count} time(s)'
+        if self.until:
+            text += f' until {self.until}'
+        if self.exceptions:
+            text += f" except {', '.join(sorted(str(day) for day in self.exceptions))}"
+        return text
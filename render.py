@@ -0,0 +1,84 @@
+'''
+    Size-aware calendar rendering: pack event rows into embed fields & pages under Discord's limits
+'''
+# Discord embed limits
+TITLE_LIMIT = 256
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+FIELD_COUNT_LIMIT = 25
+EMBED_CHAR_LIMIT = 6000
+
+# Room kept for the 'Number of events' field & the page footer
+HEADER_NAME = 'Number of events'
+COLUMNS_NAME = 'Event Name, Event Date, Event Time, Location, Contact'
+CONTINUED_NAME = '\u200b'
+FOOTER_RESERVE = 64
+
+# Cut a line that would not fit in a field on its own
+def fit_line(line):
+    if len(line) > FIELD_VALUE_LIMIT:
+        line = line[:FIELD_VALUE_LIMIT - 2] + '…\n'
+    return line
+
+# Format one event row as a single line of the calendar
+def format_event_row(event):
+    event_name, event_date, event_time, location, contact = event
+    return fit_line(f'{event_name}, {event_date}, {event_time}, {location}, {contact}\n')
+
+# Format one task row (task_name, task_deadline, status, contact) as a single line of a task list
+def format_task_row(task):
+    task_name, task_deadline, status, contact = task
+    return fit_line(f'{task_name}, due {task_deadline}, {status}, {contact}\n')
+
+# (header field name, columns field name, row formatter) of each kind of listing
+EVENT_LAYOUT = (HEADER_NAME, COLUMNS_NAME, format_event_row)
+TASK_LAYOUT = ('Number of tasks', 'Task Name, Deadline, Status, Contact', format_task_row)
+
+# Return the fields of the requested page (1-based) and whether another page follows, formatting rows only up to
+# the end of that page. Rows may be any iterable, but the bot passes the lists it already holds: the count header
+# & page flipping need every row, which the cache (or one database read) has in memory anyway.
+# Each field is a (name, value) pair; rows before the page are only formatted to find page boundaries.
+# Rows are formatted by the layout's row formatter, events by default.
+def paginate_events(events, page=1, title='', layout=EVENT_LAYOUT):
+    header_name, columns_name, format_row = layout
+    budget = EMBED_CHAR_LIMIT - min(len(title), TITLE_LIMIT) - len(header_name) - FOOTER_RESERVE
+    # One field is taken by the 'Number of events' header
+    max_fields = FIELD_COUNT_LIMIT - 1
+    current_page = 1
+    fields, chunk, chunk_len, used = [], [], 0, 0
+    name = columns_name
+
+    for line in map(format_row, events):
+        # Close the current field once the next row would overflow it
+        if chunk and chunk_len + len(line) > FIELD_VALUE_LIMIT:
+            fields.append((name, ''.join(chunk)))
+            chunk, chunk_len = [], 0
+
+        if not chunk:
+            name = columns_name if not fields else CONTINUED_NAME
+            fits = len(fields) < max_fields and used + len(name) + len(line) <= budget
+        else:
+            fits = used + len(line) <= budget
+
+        # Close the page once the next row would overflow the field count or embed size
+        if not fits:
+            if chunk:
+                fields.append((name, ''.join(chunk)))
+            if current_page == page:
+                return fields, True
+            current_page += 1
+            fields, chunk, chunk_len, used = [], [], 0, 0
+            name = columns_name
+
+        if not chunk:
+            used += len(name)
+        chunk.append(line)
+        chunk_len += len(line)
+        used += len(line)
+
+    if current_page != page:
+        return [], False
+    if chunk:
+        fields.append((name, ''.join(chunk)))
+    return fields, False
+
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from heapq import heappush, heappop
+
+from storage import event_timestamp, name_key
+
+logger = logging.getLogger(__name__)
+
+# Lead times before an event at which a reminder is sent
+DEFAULT_LEAD_TIMES = '1d,1h,10m'
+# Longest single sleep, so a changed system clock is noticed within this many seconds
+MAX_SLEEP = 3600
+# Lead time of the heap entry that schedules the next occurrence of a series once an occurrence starts
+ADVANCE = -1
+# Seconds before a reminder that could not be delivered is tried again (until its event starts)
+RETRY_DELAY = 60
+
+# Parse lead times like '1d,1h,10m' into a sorted list of minutes
+def parse_lead_times(value):
+    units = {'d': 24 * 60, 'h': 60, 'm': 1}
+    lead_times = set()
+    for part in value.split(','):
+        match = re.fullmatch(r'(\d+)([dhm])', part.strip().lower())
+        if not match:
+            raise ValueError(f"invalid reminder lead time '{part}', expected e.g. '1d', '2h' or '10m'.")
+        lead_times.add(int(match.group(1)) * units[match.group(2)])
+    return sorted(lead_times, reverse=True)
+
+# Describe a lead time in minutes, e.g. 1440 -> '1 day'
+def describe_lead_time(minutes):
+    for unit, size in (('day', 24 * 60), ('hour', 60), ('minute', 1)):
+        if minutes % size == 0:
+            n = minutes // size
+            return f'{n} {unit}' + ('s' if n != 1 else '')
+
+'''
+    Reminder scheduler: a min-heap of upcoming reminder due times; sleeps until the next one is due.
+    Entries of changed or deleted events are dropped lazily when they reach the top of the heap.
+'''
+class ReminderScheduler:
+    # send: coroutine called with a list of (guild_id, event_row, lead_minutes) that are due, returning the ones delivered
+    # lookup: returns the current row of an event given its guild, name & start 'YYYY-MM-DD HH:MM', or None if gone
+    # record: coroutine called with sent (guild_id, name_key, event_at, lead_minutes) keys to persist them
+    # next_occurrence: returns the occurrence of a series following the given start, or None
+    def __init__(self, send, lookup, record, lead_times=DEFAULT_LEAD_TIMES, next_occurrence=None):
+        self.send = send
+        self.lookup = lookup
+        self.record = record
+        self.next_occurrence = next_occurrence
+        self.lead_times = parse_lead_times(lead_times)
+        self.sent = set()
+        # Keys of reminders handed to send & not delivered yet
+        self._sending = set()
+        self._heap = []
+        self._wake = asyncio.Event()
+        self._task = None
+        self._deliveries = set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    # Schedule reminders of all given (guild_id, event_row) pairs & next occurrences of (guild_id, series_row) pairs,
+    # skipping the ones already sent
+    def load(self, events, sent=(), series_occurrences=()):
+        self.sent = set(sent)
+        self._heap.clear()
+        for guild_id, row in events:
+            self.schedule(guild_id, row)
+        for guild_id, row in series_occurrences:
+            self.schedule(guild_id, row, series=True)
+
+    # Push reminders of one event; of the lead times already passed, only the closest one is kept.
+    # Only one occurrence of a series is scheduled at a time; the next one is pushed once it starts.
+    def schedule(self, guild_id, row, now=None, series=False):
+        now = now or datetime.now()
+        event_at = event_timestamp(row[1], row[2])
+        try:
+            starts = datetime.strptime(event_at, '%Y-%m-%d %H:%M')
+        except ValueError:
+            return
+        if starts <= now:
+            return
+
+        key = name_key(row[0])
+        passed = False
+        # Lead times are sorted longest first, so the last passed one is closest to the event
+        for lead in reversed(self.lead_times):
+            due = starts - timedelta(minutes=lead)
+            if due <= now:
+                if passed:
+                    continue
+                passed = True
+            if (guild_id, key, event_at, lead) not in self.sent and (guild_id, key, event_at, lead) not in self._sending:
+                heappush(self._heap, (due, event_at, guild_id, key, lead))
+        if series:
+            heappush(self._heap, (starts, event_at, guild_id, key, ADVANCE))
+        self._wake.set()
+
+    # Pop every reminder due by now that still matches a live event
+    def pop_due(self, now=None):
+        now = now or datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, event_at, guild_id, key, lead = heappop(self._heap)
+            if lead == ADVANCE:
+                # Skip occurrences that already started, e.g. while the bot was offline
+                after = max(event_at, now.strftime('%Y-%m-%d %H:%M'))
+                upcoming = self.next_occurrence(guild_id, key, after) if self.next_occurrence else None
+                if upcoming:
+                    self.schedule(guild_id, upcoming, now, series=True)
+                continue
+
+            row = self.lookup(guild_id, key, event_at)
+            if not row or (guild_id, key, event_at, lead) in self.sent or (guild_id, key, event_at, lead) in self._sending:
+                continue
+            self._sending.add((guild_id, key, event_at, lead))
+            due.append((guild_id, row, lead))
+        return due
+
+    # Seconds until the next reminder is due, or None when nothing is scheduled
+    def next_delay(self, now=None):
+        if not self._heap:
+            return None
+        return max((self._heap[0][0] - (now or datetime.now())).total_seconds(), 0)
+
+    # Forget sent records of events that already happened, of one guild or of all guilds
+    def forget_before(self, day, guild_id=None):
+        self.sent = {sent for sent in self.sent if sent[2] >= str(day) or (guild_id is not None and sent[0] != guild_id)}
+
+    # Send due reminders, recording the delivered ones as sent & scheduling the others to be tried again
+    async def deliver(self, due):
+        try:
+            delivered = await self.send(due) or []
+        except Exception as e:
+            logger.error('Error: %s', e)
+            delivered = []
+        delivered_keys = [(guild_id, name_key(row[0]), event_timestamp(row[1], row[2]), lead) for guild_id, row, lead in delivered]
+        self.sent.update(delivered_keys)
+        retry_at = datetime.now() + timedelta(seconds=RETRY_DELAY)
+        for guild_id, row, lead in due:
+            key = (guild_id, name_key(row[0]), event_timestamp(row[1], row[2]), lead)
+            self._sending.discard(key)
+            if key not in self.sent and retry_at.strftime('%Y-%m-%d %H:%M') < key[2]:
+                heappush(self._heap, (retry_at, key[2], guild_id, key[1], lead))
+                self._wake.set()
+        try:
+            if delivered_keys:
+                await self.record(delivered_keys)
+        except Exception as e:
+            logger.error('Error: %s', e)
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            due = self.pop_due()
+            if due:
+                # Deliver in the background so a slow send never delays the next due reminder
+                delivery = asyncio.create_task(self.deliver(due))
+                self._deliveries.add(delivery)
+                delivery.add_done_callback(self._deliveries.discard)
+                continue
+
+            delay = self.next_delay()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=MAX_SLEEP if delay is None else min(delay, MAX_SLEEP))
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
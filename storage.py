@@ -0,0 +1,845 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# Columns returned for an event, in the order the bot unpacks them
+EVENT_COLUMNS = 'event_name, event_date, event_time, location, contact'
+# Columns of a recurring event series, in the order recurrence.Series.from_row reads them
+# ("interval" & "count" are quoted as they are keywords in PostgreSQL)
+SERIES_COLUMNS = 'event_name, start_date, event_time, location, contact, freq, "interval", "count", until, exceptions'
+# Every event & every series of every guild, for warming caches at startup
+ALL_GUILD_EVENTS = f'SELECT guild_id, {EVENT_COLUMNS}, end_time FROM events ORDER BY guild_id, event_at'
+ALL_GUILD_SERIES = f'SELECT guild_id, {SERIES_COLUMNS} FROM event_series ORDER BY guild_id, series_id'
+
+# Columns returned for a task, in the order the bot unpacks them
+TASK_COLUMNS = 'task_name, task_deadline, status, contact'
+TASK_STATUSES = ('open', 'done')
+
+# Build the sortable 'YYYY-MM-DD HH:MM' timestamp of an event from its date & display time (e.g. '9:05 PM')
+def event_timestamp(event_date, event_time):
+    try:
+        clock = datetime.strptime(str(event_time).strip().upper(), '%I:%M %p').strftime('%H:%M')
+    except ValueError:
+        clock = '00:00'
+    return f'{event_date} {clock}'
+
+# Case-folded key used for event name lookups
+def name_key(event_name):
+    return str(event_name).strip().casefold()
+
+# Inclusive timestamp bounds covering whole days from start to end
+def day_bounds(start, end=None):
+    return (f'{start} 00:00', f'{end or start} 23:59')
+
+# Build an FTS5 query matching every word of the search terms as a prefix, optionally within one column
+def fts_query(terms, column=None):
+    scope = f'{column} : ' if column else ''
+    return ' '.join(f'{scope}"{word}"*' for word in re.findall(r'\w+', terms))
+
+'''
+    Schema migrations, applied in order & tracked with PRAGMA user_version
+'''
+# v1: original tables
+def _migration_initial(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            event_name TEXT,
+            event_date TEXT,
+            event_time TEXT,
+            location TEXT,
+            contact TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS todos (
+            task_name TEXT,
+            task_deadline TEXT,
+            status TEXT,
+            contact TEXT
+        )
+    ''')
+
+# v2: primary key, sortable timestamp, case-folded name key & indexes for range scans
+def _migration_indexed_events(cursor):
+    cursor.execute('''
+        CREATE TABLE events_v2 (
+            event_id INTEGER PRIMARY KEY,
+            event_name TEXT,
+            event_date TEXT,
+            event_time TEXT,
+            location TEXT,
+            contact TEXT,
+            event_at TEXT NOT NULL,
+            name_key TEXT NOT NULL
+        )
+    ''')
+    rows = cursor.execute(f'SELECT {EVENT_COLUMNS} FROM events').fetchall()
+    cursor.executemany(
+        f'INSERT INTO events_v2 ({EVENT_COLUMNS}, event_at, name_key) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        [(*row, event_timestamp(row[1], row[2]), name_key(row[0])) for row in rows]
+    )
+    cursor.execute('DROP TABLE events')
+    cursor.execute('ALTER TABLE events_v2 RENAME TO events')
+    cursor.execute('CREATE INDEX idx_events_event_at ON events (event_at)')
+    cursor.execute('CREATE INDEX idx_events_name_key ON events (name_key)')
+    cursor.execute('CREATE INDEX idx_events_contact ON events (contact COLLATE NOCASE)')
+
+# v3: record of reminders already sent, so none is announced twice
+def _migration_reminders_sent(cursor):
+    cursor.execute('''
+        CREATE TABLE reminders_sent (
+            name_key TEXT NOT NULL,
+            event_at TEXT NOT NULL,
+            lead_minutes INTEGER NOT NULL,
+            sent_at TEXT NOT NULL,
+            PRIMARY KEY (name_key, event_at, lead_minutes)
+        )
+    ''')
+
+# v4: per-guild calendars; rows from before are claimed by the legacy SERVER_ID guild on connect
+def _migration_guild_calendars(cursor):
+    cursor.execute('ALTER TABLE events ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('ALTER TABLE todos ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('DROP INDEX idx_events_name_key')
+    cursor.execute('DROP INDEX idx_events_contact')
+    cursor.execute('CREATE INDEX idx_events_guild_event_at ON events (guild_id, event_at)')
+    cursor.execute('CREATE INDEX idx_events_guild_name_key ON events (guild_id, name_key)')
+    cursor.execute('CREATE INDEX idx_events_guild_contact ON events (guild_id, contact COLLATE NOCASE)')
+    cursor.execute('''
+        CREATE TABLE reminders_sent_v4 (
+            guild_id INTEGER NOT NULL,
+            name_key TEXT NOT NULL,
+            event_at TEXT NOT NULL,
+            lead_minutes INTEGER NOT NULL,
+            sent_at TEXT NOT NULL,
+            PRIMARY KEY (guild_id, name_key, event_at, lead_minutes)
+        )
+    ''')
+    cursor.execute('INSERT INTO reminders_sent_v4 SELECT 0, name_key, event_at, lead_minutes, sent_at FROM reminders_sent')
+    cursor.execute('DROP TABLE reminders_sent')
+    cursor.execute('ALTER TABLE reminders_sent_v4 RENAME TO reminders_sent')
+
+# v5: full-text index over event name, location & contact, kept in sync by triggers.
+# Skipped on SQLite builds without FTS5, where searches fall back to LIKE scans.
+def _migration_full_text_search(cursor):
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE events_fts USING fts5(
+                event_name, location, contact,
+                content='events', content_rowid='event_id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning('Full-text search unavailable, using LIKE fallback: %s', e)
+        return
+    cursor.execute('''
+        CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts (rowid, event_name, location, contact) VALUES (new.event_id, new.event_name, new.location, new.contact);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, event_name, location, contact) VALUES ('delete', old.event_id, old.event_name, old.location, old.contact);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER events_fts_update AFTER UPDATE OF event_name, location, contact ON events BEGIN
+            INSERT INTO events_fts (events_fts, rowid, event_name, location, contact) VALUES ('delete', old.event_id, old.event_name, old.location, old.contact);
+            INSERT INTO events_fts (rowid, event_name, location, contact) VALUES (new.event_id, new.event_name, new.location, new.contact);
+        END
+    ''')
+    cursor.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+
+# v6: recurring events, stored once per series & expanded into occurrences on read
+def _migration_event_series(cursor):
+    cursor.execute('''
+        CREATE TABLE event_series (
+            series_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            event_name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            event_time TEXT NOT NULL,
+            location TEXT,
+            contact TEXT,
+            freq TEXT NOT NULL,
+            interval INTEGER NOT NULL DEFAULT 1,
+            count INTEGER,
+            until TEXT,
+            exceptions TEXT NOT NULL DEFAULT '',
+            last_date TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_event_series_guild_name_key ON event_series (guild_id, name_key)')
+    cursor.execute('CREATE INDEX idx_event_series_last_date ON event_series (last_date)')
+
+# v7: todos become tasks with a primary key, case-folded name & contact keys, sortable 'YYYY-MM-DD' deadlines
+# & indexes so a person's open tasks by deadline (or a guild's tasks of one status) are one index range read
+def _migration_tasks(cursor):
+    cursor.execute('''
+        CREATE TABLE todos_v7 (
+            task_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            task_name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            task_deadline TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open',
+            contact TEXT NOT NULL,
+            contact_key TEXT NOT NULL,
+            completed_at TEXT
+        )
+    ''')
+    rows = cursor.execute('SELECT guild_id, task_name, task_deadline, status, contact FROM todos').fetchall()
+    migrated = []
+    for guild_id, task_name, task_deadline, status, contact in rows:
+        deadline = str(task_deadline or '')
+        for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%m-%d-%Y'):
+            try:
+                deadline = datetime.strptime(deadline[:10], fmt).strftime('%Y-%m-%d')
+                break
+            except ValueError:
+                pass
+        status = str(status or '').strip().lower()
+        status = status if status in TASK_STATUSES else 'open'
+        migrated.append((guild_id, str(task_name or ''), name_key(task_name or ''), deadline, status, str(contact or ''), name_key(contact or '')))
+    cursor.executemany(
+        'INSERT INTO todos_v7 (guild_id, task_name, name_key, task_deadline, status, contact, contact_key) VALUES (?, ?, ?, ?, ?, ?, ?)',
+        migrated
+    )
+    cursor.execute('DROP TABLE todos')
+    cursor.execute('ALTER TABLE todos_v7 RENAME TO todos')
+    cursor.execute('CREATE INDEX idx_todos_guild_contact_status_deadline ON todos (guild_id, contact_key, status, task_deadline)')
+    cursor.execute('CREATE INDEX idx_todos_guild_status_deadline ON todos (guild_id, status, task_deadline)')
+    cursor.execute('CREATE INDEX idx_todos_guild_name_key ON todos (guild_id, name_key)')
+
+# v8: number of events per guild, kept up to date by triggers so counting never scans the table
+def _migration_event_counts(cursor):
+    cursor.execute('CREATE TABLE event_counts (guild_id INTEGER PRIMARY KEY, n INTEGER NOT NULL)')
+    cursor.execute('INSERT INTO event_counts SELECT guild_id, Count(*) FROM events GROUP BY guild_id')
+    cursor.execute('''
+        CREATE TRIGGER event_counts_insert AFTER INSERT ON events BEGIN
+            INSERT INTO event_counts (guild_id, n) VALUES (new.guild_id, 1) ON CONFLICT (guild_id) DO UPDATE SET n = n + 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER event_counts_delete AFTER DELETE ON events BEGIN
+            UPDATE event_counts SET n = n - 1 WHERE guild_id = old.guild_id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER event_counts_update AFTER UPDATE OF guild_id ON events BEGIN
+            UPDATE event_counts SET n = n - 1 WHERE guild_id = old.guild_id;
+            INSERT INTO event_counts (guild_id, n) VALUES (new.guild_id, 1) ON CONFLICT (guild_id) DO UPDATE SET n = n + 1;
+        END
+    ''')
+
+# v9: optional end time of events (display format like event_time); NULL means the default duration
+def _migration_event_end_time(cursor):
+    cursor.execute('ALTER TABLE events ADD COLUMN end_time TEXT')
+
+# v10: archive of past events, moved out of events in batches by refresh instead of being deleted
+def _migration_events_archive(cursor):
+    cursor.execute('''
+        CREATE TABLE events_archive (
+            archive_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            event_name TEXT,
+            event_date TEXT,
+            event_time TEXT,
+            location TEXT,
+            contact TEXT,
+            event_at TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            end_time TEXT,
+            archived_at TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_events_archive_guild_event_at ON events_archive (guild_id, event_at)')
+    cursor.execute('CREATE INDEX idx_events_archive_event_at ON events_archive (event_at)')
+
+MIGRATIONS = [
+    _migration_initial,
+    _migration_indexed_events,
+    _migration_reminders_sent,
+    _migration_guild_calendars,
+    _migration_full_text_search,
+    _migration_event_series,
+    _migration_tasks,
+    _migration_event_counts,
+    _migration_event_end_time,
+    _migration_events_archive,
+]
+
+# Storage operation running in the current task, so database work is attributed to it
+db_operation = contextvars.ContextVar('db_operation', default=None)
+# SQLite progress handler granularity, in VM instructions
+PROGRESS_STEPS = 1000
+# Most events moved to the archive (or purged from it) per transaction
+ARCHIVE_BATCH_SIZE = 500
+# Seconds writes are collected for before they are committed together in one transaction
+GROUP_COMMIT_WINDOW = 0.002
+# Connection settings: WAL lets reads run alongside a commit; synchronous=FULL fsyncs every commit so an
+# acknowledged write survives power loss, with group commit amortizing that fsync over many writes
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=FULL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA busy_timeout=5000',
+)
+
+# Record latency, errors & rows returned of a storage operation
+def instrumented(method):
+    op = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        token = db_operation.set(op)
+        start = time.perf_counter()
+        try:
+            result = await method(self, *args, **kwargs)
+        except Exception:
+            metrics.inc('calendar_db_errors_total', op=op)
+            raise
+        finally:
+            metrics.observe('calendar_db_seconds', time.perf_counter() - start, op=op)
+            db_operation.reset(token)
+        if isinstance(result, (list, set)):
+            metrics.inc('calendar_db_rows_returned_total', len(result), op=op)
+        elif isinstance(result, tuple):
+            metrics.inc('calendar_db_rows_returned_total', op=op)
+        return result
+    return wrapper
+
+'''
+    Storage interface: every query & mutation the bot runs, written once in SQL that each backend accepts
+    ('?' placeholders). A backend provides the primitives below & overrides the queries its database runs differently.
+'''
+class BaseStorage:
+    # Case-insensitive LIKE operator & LIMIT meaning no limit, which differ between databases
+    LIKE = 'LIKE'
+    NO_LIMIT = -1
+    # Whether the events_fts full-text index exists
+    fts = False
+
+    # Start connecting & bringing the schema up to date without blocking the event loop; returns an awaitable.
+    # Queries issued meanwhile wait for it.
+    def open(self):
+        raise NotImplementedError
+
+    # Rows of a query as tuples
+    async def fetchall(self, query, params=()):
+        raise NotImplementedError
+
+    # First row of a query as a tuple, or None
+    async def fetchone(self, query, params=()):
+        raise NotImplementedError
+
+    # Apply one or more (query, params) statements atomically; returns rowcount of the last statement once committed
+    async def write(self, *statements):
+        raise NotImplementedError
+
+    # Apply one statement for every row of params atomically
+    async def write_many(self, query, rows):
+        raise NotImplementedError
+
+    # Every event & series of every guild as (event rows, series rows), read so that no write lands between the two
+    async def get_all_guild_rows(self):
+        raise NotImplementedError
+
+    # Stream events of a guild in date & time order, fetching batch_size rows at a time
+    async def iter_events(self, guild_id, batch_size=500):
+        raise NotImplementedError
+        yield
+
+    # Commit writes still waiting & close every connection
+    async def close(self):
+        raise NotImplementedError
+
+    '''
+        Queries (every calendar query is scoped to one guild)
+    '''
+    @instrumented
+    async def get_all_events(self, guild_id):
+        return await self.fetchall(f'SELECT {EVENT_COLUMNS} FROM events WHERE guild_id=? ORDER BY event_at', (guild_id,))
+
+    # Every event of a guild with its end time, as (event_name, ..., contact, end_time) rows like the cache holds them
+    @instrumented
+    async def get_event_rows(self, guild_id):
+        return await self.fetchall(f'SELECT {EVENT_COLUMNS}, end_time FROM events WHERE guild_id=? ORDER BY event_at', (guild_id,))
+
+    # Every event of every guild as (guild_id, event_name, ..., end_time) rows, for warming caches at startup
+    @instrumented
+    async def get_all_guild_events(self):
+        return await self.fetchall(ALL_GUILD_EVENTS)
+
+    # Index range scan over (guild_id, event_at), already ordered by date & time
+    @instrumented
+    async def get_upcoming_events(self, guild_id, start, end):
+        return await self.fetchall(f'''
+            SELECT {EVENT_COLUMNS} FROM events
+            WHERE guild_id=? AND event_at BETWEEN ? AND ?
+            ORDER BY event_at
+        ''', (guild_id, *day_bounds(start, end)))
+
+    # Events of a day range with their end times, optionally of one contact (case-insensitive), for
+    # conflict & free slot sweeps; one index range scan over (guild_id, event_at)
+    @instrumented
+    async def get_busy_events(self, guild_id, start, end, contact=None):
+        scope, params = ('AND lower(contact)=lower(?)', (contact,)) if contact else ('', ())
+        return await self.fetchall(f'''
+            SELECT {EVENT_COLUMNS}, end_time FROM events
+            WHERE guild_id=? AND event_at BETWEEN ? AND ? {scope}
+            ORDER BY event_at
+        ''', (guild_id, *day_bounds(start, end), *params))
+
+    # Archived events of a guild between two days, optionally whose name or contact contains text;
+    # one index range scan over (guild_id, event_at)
+    @instrumented
+    async def get_archived_events(self, guild_id, start, end, text=None, limit=1000):
+        scope, params = (f'AND (event_name {self.LIKE} ? OR contact {self.LIKE} ?)', (f'%{text}%', f'%{text}%')) if text else ('', ())
+        return await self.fetchall(f'''
+            SELECT {EVENT_COLUMNS} FROM events_archive
+            WHERE guild_id=? AND event_at BETWEEN ? AND ? {scope}
+            ORDER BY event_at
+            LIMIT ?
+        ''', (guild_id, *day_bounds(start, end), *params, limit))
+
+    @instrumented
+    async def get_event_end_time(self, guild_id, event_name):
+        row = await self.fetchone('SELECT end_time FROM events WHERE guild_id=? AND name_key=?', (guild_id, name_key(event_name)))
+        return row[0] if row else None
+
+    @instrumented
+    async def search_event(self, guild_id, event_name):
+        return await self.fetchone(f'SELECT {EVENT_COLUMNS} FROM events WHERE guild_id=? AND name_key=?', (guild_id, name_key(event_name)))
+
+    # Every series of every guild as (guild_id, event_name, start_date, event_time, location, contact, freq, interval, count, until, exceptions) rows
+    @instrumented
+    async def get_all_guild_series(self):
+        return await self.fetchall(ALL_GUILD_SERIES)
+
+    # Case-folded names of every event of a guild, for duplicate checks of bulk imports
+    @instrumented
+    async def get_event_names(self, guild_id):
+        rows = await self.fetchall('SELECT name_key FROM events WHERE guild_id=?', (guild_id,))
+        return {row[0] for row in rows}
+
+    # Search events by words (prefix match) in name, location & contact, or only in the given column.
+    # Ranked by relevance with FTS5, or ordered by date & time with the LIKE fallback.
+    @instrumented
+    async def search_events(self, guild_id, terms, column=None, limit=250):
+        query = fts_query(terms, column)
+        if not query:
+            return []
+        # FTS5 index of SQLite databases
+        if self.fts and column:
+            # Matches are looked up once in the index, fetched by rowid & sorted; joining instead lets SQLite walk
+            # the guild's events in date order & re-run the MATCH for each ('+' keeps it off the guild index too)
+            return await self.fetchall(f'''
+                SELECT {EVENT_COLUMNS} FROM events
+                WHERE event_id IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?) AND +guild_id=?
+                ORDER BY event_at
+                LIMIT ?
+            ''', (query, guild_id, limit))
+        if self.fts:
+            return await self.fetchall(f'''
+                SELECT {', '.join(f'e.{name}' for name in EVENT_COLUMNS.split(', '))}
+                FROM events_fts JOIN events e ON e.event_id = events_fts.rowid
+                WHERE events_fts MATCH ? AND e.guild_id=?
+                ORDER BY bm25(events_fts)
+                LIMIT ?
+            ''', (query, guild_id, limit))
+
+        columns = [column] if column else ['event_name', 'location', 'contact']
+        words = re.findall(r'\w+', terms)
+        matches = ' AND '.join('(' + ' OR '.join(f'{name} {self.LIKE} ?' for name in columns) + ')' for _ in words)
+        params = [f'%{word}%' for word in words for _ in columns]
+        return await self.fetchall(f'''
+            SELECT {EVENT_COLUMNS} FROM events
+            WHERE guild_id=? AND {matches}
+            ORDER BY event_at
+            LIMIT ?
+        ''', (guild_id, *params, limit if limit >= 0 else self.NO_LIMIT))
+
+    # Read from the trigger-maintained counter instead of counting rows
+    @instrumented
+    async def count_events(self, guild_id):
+        row = await self.fetchone('SELECT n FROM event_counts WHERE guild_id=?', (guild_id,))
+        return row[0] if row else 0
+
+    @instrumented
+    async def count_events_on(self, guild_id, day):
+        row = await self.fetchone('SELECT Count(*) FROM events WHERE guild_id=? AND event_at BETWEEN ? AND ?', (guild_id, *day_bounds(day)))
+        return row[0]
+
+    '''
+        Tasks: each read is a single range scan of one of the todos indexes, ordered by deadline
+    '''
+    # Tasks of a person (exact, case-insensitive contact) with a status, optionally only those due before a day
+    @instrumented
+    async def get_tasks_by_contact(self, guild_id, contact, status='open', before=None):
+        return await self.fetchall(f'''
+            SELECT {TASK_COLUMNS} FROM todos
+            WHERE guild_id=? AND contact_key=? AND status=? AND task_deadline < ?
+            ORDER BY task_deadline
+        ''', (guild_id, name_key(contact), status, str(before or '9999-12-31')))
+
+    # Tasks of a guild with a status, optionally only those due before a day (e.g. overdue open tasks)
+    @instrumented
+    async def get_tasks_by_status(self, guild_id, status='open', before=None):
+        return await self.fetchall(f'''
+            SELECT {TASK_COLUMNS} FROM todos
+            WHERE guild_id=? AND status=? AND task_deadline < ?
+            ORDER BY task_deadline
+        ''', (guild_id, status, str(before or '9999-12-31')))
+
+    @instrumented
+    async def get_open_task(self, guild_id, task_name):
+        return await self.fetchone(f"SELECT {TASK_COLUMNS} FROM todos WHERE guild_id=? AND name_key=? AND status='open'", (guild_id, name_key(task_name)))
+
+    @instrumented
+    async def get_sent_reminders(self):
+        return await self.fetchall('SELECT guild_id, name_key, event_at, lead_minutes FROM reminders_sent')
+
+    '''
+        Mutations
+    '''
+    @instrumented
+    async def insert_event(self, guild_id, event_name, event_date, event_time, location, contact, end_time=None):
+        return await self.write((
+            f'INSERT INTO events (guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (guild_id, event_name, event_date, event_time, location, contact, event_timestamp(event_date, event_time), name_key(event_name), end_time)
+        ))
+
+    # Insert many events in one transaction
+    @instrumented
+    async def insert_events(self, guild_id, rows):
+        return await self.write_many(
+            f'INSERT INTO events (guild_id, {EVENT_COLUMNS}, event_at, name_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [(guild_id, *row, event_timestamp(row[1], row[2]), name_key(row[0])) for row in rows]
+        )
+
+    @instrumented
+    async def update_event(self, guild_id, old_name, event_name, event_date, event_time, location, contact, end_time=None):
+        return await self.write(('''
+            UPDATE events
+            SET event_name=?, event_date=?, event_time=?, location=?, contact=?, event_at=?, name_key=?, end_time=?
+            WHERE guild_id=? AND name_key=?
+        ''', (event_name, event_date, event_time, location, contact, event_timestamp(event_date, event_time), name_key(event_name), end_time, guild_id, name_key(old_name))))
+
+    @instrumented
+    async def delete_event(self, guild_id, event_name):
+        return await self.write(('DELETE FROM events WHERE guild_id=? AND name_key=?', (guild_id, name_key(event_name))))
+
+    # Move up to limit of the earliest events on a day before the given date into events_archive (or only delete them
+    # when archive is False), of one guild or of all guilds when guild_id is None; returns number of events moved.
+    # Any timestamp on an earlier day sorts before the bare 'YYYY-MM-DD' of the given day, so each batch is a range
+    # read from the start of the event_at index; rows already moved are gone from it.
+    @instrumented
+    async def archive_events_before(self, day, guild_id=None, limit=ARCHIVE_BATCH_SIZE, archive=True):
+        scope, params = ('guild_id=? AND ', (guild_id, str(day), limit)) if guild_id is not None else ('', (str(day), limit))
+        batch = f'SELECT event_id FROM events WHERE {scope}event_at < ? ORDER BY event_at LIMIT ?'
+        statements = [(f'DELETE FROM events WHERE event_id IN ({batch})', params)]
+        if archive:
+            statements.insert(0, (f'''
+                INSERT INTO events_archive (guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time, archived_at)
+                SELECT guild_id, {EVENT_COLUMNS}, event_at, name_key, end_time, ? FROM events WHERE event_id IN ({batch})
+            ''', (datetime.now().strftime('%Y-%m-%d %H:%M'), *params)))
+        return await self.write(*statements)
+
+    # Forget sent reminders of events on a day before the given date
+    @instrumented
+    async def delete_reminders_before(self, day, guild_id=None):
+        scope, params = ('guild_id=? AND ', (guild_id, str(day))) if guild_id is not None else ('', (str(day),))
+        return await self.write((f'DELETE FROM reminders_sent WHERE {scope}event_at < ?', params))
+
+    # Delete up to limit of the earliest archived events on a day before the given date (retention), of every guild
+    @instrumented
+    async def purge_archive_before(self, day, limit=ARCHIVE_BATCH_SIZE):
+        return await self.write((
+            'DELETE FROM events_archive WHERE archive_id IN (SELECT archive_id FROM events_archive WHERE event_at < ? ORDER BY event_at LIMIT ?)',
+            (str(day), limit)
+        ))
+
+    # Record reminders as sent, given (guild_id, name_key, event_at, lead_minutes) keys
+    @instrumented
+    async def mark_reminders_sent(self, keys):
+        sent_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+        return await self.write_many(
+            'INSERT INTO reminders_sent (guild_id, name_key, event_at, lead_minutes, sent_at) VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING',
+            [(*key, sent_at) for key in keys]
+        )
+
+    @instrumented
+    async def clear_events(self, guild_id):
+        return await self.write(
+            ('DELETE FROM event_series WHERE guild_id=?', (guild_id,)),
+            ('DELETE FROM events WHERE guild_id=?', (guild_id,))
+        )
+
+    @instrumented
+    async def insert_task(self, guild_id, task_name, task_deadline, contact):
+        return await self.write((
+            f"INSERT INTO todos (guild_id, {TASK_COLUMNS}, name_key, contact_key) VALUES (?, ?, ?, 'open', ?, ?, ?)",
+            (guild_id, task_name, str(task_deadline), contact, name_key(task_name), name_key(contact))
+        ))
+
+    # Mark the open task with the given name as done, returning number of tasks completed
+    @instrumented
+    async def complete_task(self, guild_id, task_name):
+        return await self.write((
+            "UPDATE todos SET status='done', completed_at=? WHERE guild_id=? AND name_key=? AND status='open'",
+            (datetime.now().strftime('%Y-%m-%d %H:%M'), guild_id, name_key(task_name))
+        ))
+
+    @instrumented
+    async def reassign_task(self, guild_id, task_name, contact):
+        return await self.write((
+            "UPDATE todos SET contact=?, contact_key=? WHERE guild_id=? AND name_key=? AND status='open'",
+            (contact, name_key(contact), guild_id, name_key(task_name))
+        ))
+
+    # Insert a series given its recurrence.Series.to_row() (SERIES_COLUMNS + last_date)
+    @instrumented
+    async def insert_series(self, guild_id, series_row):
+        return await self.write((
+            f'INSERT INTO event_series (guild_id, name_key, {SERIES_COLUMNS}, last_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (guild_id, name_key(series_row[0]), *series_row)
+        ))
+
+    @instrumented
+    async def update_series_exceptions(self, guild_id, event_name, exceptions):
+        return await self.write(('UPDATE event_series SET exceptions=? WHERE guild_id=? AND name_key=?', (exceptions, guild_id, name_key(event_name))))
+
+    @instrumented
+    async def delete_series(self, guild_id, event_name):
+        return await self.write(('DELETE FROM event_series WHERE guild_id=? AND name_key=?', (guild_id, name_key(event_name))))
+
+    # Delete series whose last occurrence is on a day before the given date; live series are kept
+    @instrumented
+    async def delete_series_ended_before(self, day, guild_id=None):
+        scope, params = ('guild_id=? AND ', (guild_id, str(day))) if guild_id is not None else ('', (str(day),))
+        return await self.write((f'DELETE FROM event_series WHERE {scope}last_date < ?', params))
+
+'''
+    SQLite backend (default): every SQLite call runs on a dedicated database thread
+    so that a slow query or commit never stalls the Discord event loop.
+    Writes are group-committed: those arriving within commit_window seconds share one transaction,
+    & each caller is only answered once that transaction is durable.
+'''
+class Storage(BaseStorage):
+    # legacy_guild_id: guild that owns rows saved before calendars were per guild
+    def __init__(self, path='calendar.db', legacy_guild_id=None, commit_window=GROUP_COMMIT_WINDOW):
+        self.path = path
+        self.legacy_guild_id = legacy_guild_id
+        self.commit_window = commit_window
+        # Whether the events_fts full-text index exists
+        self.fts = False
+        self.sql = None
+        self.cursor = None
+        # A single worker serializes all access to the connection (one writer thread)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='calendar-db')
+        # Writes waiting for the next group commit, as (statements, future) pairs
+        self._pending = []
+        self._flusher = None
+        # Future of the connection being opened by open()
+        self._opening = None
+
+    # Run a blocking function on the database thread & await its result
+    async def run(self, fn, *args):
+        if self._opening:
+            # Raises here if opening the database failed
+            await self._opening
+        loop = asyncio.get_running_loop()
+        result, steps = await loop.run_in_executor(self._executor, self._counted, fn, args)
+        # SQLite VM instructions executed, a proxy for rows scanned
+        metrics.inc('calendar_db_vm_steps_total', steps, op=db_operation.get() or fn.__name__)
+        return result
+
+    # Call fn on the database thread, counting VM instructions it executes
+    def _counted(self, fn, args):
+        self._progress = 0
+        result = fn(*args)
+        return result, self._progress * PROGRESS_STEPS
+
+    def _on_progress(self):
+        self._progress += 1
+        return 0
+
+    # Queue a write of one or more (query, params) statements, applied atomically; returns rowcount of the last
+    # statement once committed
+    async def write(self, *statements):
+        return await self._queue([(query, params, False) for query, params in statements])
+
+    # Queue one statement executed for every row of params
+    async def write_many(self, query, rows):
+        return await self._queue([(query, rows, True)])
+
+    def _queue(self, statements):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((statements, future))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush())
+        return future
+
+    # Commit every write queued during the window in one transaction & answer each caller
+    async def _flush(self):
+        db_operation.set('group_commit')
+        await asyncio.sleep(self.commit_window)
+        batch, self._pending, self._flusher = self._pending, [], None
+        try:
+            results = await self.run(self._commit_batch, [statements for statements, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        metrics.inc('calendar_db_commits_total')
+        metrics.inc('calendar_db_group_commit_writes_total', len(batch))
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    # Apply writes in one transaction, each in its own savepoint so a failing write only fails its caller
+    def _commit_batch(self, batch):
+        results = []
+        try:
+            self.cursor.execute('BEGIN')
+            for statements in batch:
+                self.cursor.execute('SAVEPOINT write')
+                try:
+                    for query, params, many in statements:
+                        if many:
+                            self.cursor.executemany(query, params)
+                        else:
+                            self.cursor.execute(query, params)
+                    results.append(self.cursor.rowcount)
+                    self.cursor.execute('RELEASE write')
+                except sqlite3.Error as e:
+                    self.cursor.execute('ROLLBACK TO write')
+                    self.cursor.execute('RELEASE write')
+                    results.append(e)
+            self.sql.commit()
+        except Exception:
+            self.sql.rollback()
+            raise
+        return results
+
+    # Open the connection on the database thread, blocking the caller until done
+    def connect(self):
+        return self._executor.submit(self._connect).result()
+
+    # Start opening & migrating the database on its thread without blocking the event loop; returns an awaitable.
+    # Queries issued meanwhile queue behind it on the same thread.
+    def open(self):
+        if self._opening is None:
+            self._opening = asyncio.get_running_loop().run_in_executor(self._executor, self._connect)
+        return self._opening
+
+    def _connect(self):
+        # Connecting to local database & bring its schema up to date
+        self.sql = sqlite3.connect(self.path)
+        self.cursor = self.sql.cursor()
+        self._progress = 0
+        self.sql.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+        for pragma in PRAGMAS:
+            self.cursor.execute(pragma)
+        self._migrate()
+        self.fts = bool(self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name='events_fts'").fetchone())
+        if self.legacy_guild_id:
+            self._adopt_legacy_rows()
+
+    # Move rows without a guild (guild_id 0) into the legacy guild's calendar
+    def _adopt_legacy_rows(self):
+        for table in ('events', 'todos', 'reminders_sent', 'event_series'):
+            self.cursor.execute(f'UPDATE {table} SET guild_id=? WHERE guild_id=0', (self.legacy_guild_id,))
+        self.sql.commit()
+
+    # Apply every migration newer than the database's schema version, each in its own transaction
+    def _migrate(self):
+        version = self.cursor.execute('PRAGMA user_version').fetchone()[0]
+        for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            # Opened explicitly: sqlite3 only begins transactions before DML, so DDL would otherwise autocommit
+            self.cursor.execute('BEGIN')
+            try:
+                migration(self.cursor)
+                self.cursor.execute(f'PRAGMA user_version = {i}')
+                self.sql.commit()
+            except Exception:
+                self.sql.rollback()
+                raise
+
+    def _fetchall(self, query, params=()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchall()
+
+    def _fetchone(self, query, params=()):
+        self.cursor.execute(query, params)
+        return self.cursor.fetchone()
+
+    async def fetchall(self, query, params=()):
+        return await self.run(self._fetchall, query, params)
+
+    async def fetchone(self, query, params=()):
+        return await self.run(self._fetchone, query, params)
+
+    # Open a separate cursor so long reads can be fetched in batches alongside other queries
+    def _open_cursor(self, query, params=()):
+        return self.sql.execute(query, params)
+
+    def _close(self):
+        if self.cursor:
+            self.cursor.close()
+        if self.sql:
+            self.sql.close()
+        self.sql = self.cursor = None
+
+    # Both reads run in one call on the database thread, so no write can land between them
+    @instrumented
+    async def get_all_guild_rows(self):
+        return await self.run(self._fetch_all_guild_rows)
+
+    def _fetch_all_guild_rows(self):
+        return self._fetchall(ALL_GUILD_EVENTS), self._fetchall(ALL_GUILD_SERIES)
+
+    async def iter_events(self, guild_id, batch_size=500):
+        cursor = await self.run(self._open_cursor, f'SELECT {EVENT_COLUMNS} FROM events WHERE guild_id=? ORDER BY event_at', (guild_id,))
+        try:
+            while True:
+                rows = await self.run(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            await self.run(cursor.close)
+
+    async def close(self):
+        # Commit writes still waiting for their group commit first
+        if self._flusher:
+            await self._flusher
+        await self.run(self._close)
+        self._executor.shutdown(wait=False)
+
+# Storage backend of a database URL: 'postgresql://…' (or 'postgres://…') for a PostgreSQL server shared by
+# several bot processes, else the path of a local SQLite file (optionally given as 'sqlite:///<path>').
+# pool_options (min_size, max_size) only apply to PostgreSQL.
+def create_storage(url, legacy_guild_id=None, **pool_options):
+    if url.startswith(('postgresql://', 'postgres://')):
+        # Imported here so SQLite deployments never need asyncpg
+        from postgres_storage import PostgresStorage
+        return PostgresStorage(url, **pool_options)
+    return Storage(url.removeprefix('sqlite:///'), legacy_guild_id=legacy_guild_id)
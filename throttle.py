@@ -0,0 +1,144 @@
+import asyncio
+import re
+import time
+
+from instrumentation import metrics
+
+# Seconds a rendered calendar is served from cache before it is computed again
+DEFAULT_VIEW_TTL = 30
+# Most rendered calendars kept at once
+MAX_VIEWS = 1024
+# Rate limiters forget idle (full) buckets once they track more keys than this
+MAX_BUCKETS = 4096
+
+# Parse a rate like '5/10' (5 commands per 10 seconds) into (capacity, seconds)
+def parse_rate(value):
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(\d+(?:\.\d+)?)\s*', value)
+    if not match or int(match.group(1)) < 1 or float(match.group(2)) <= 0:
+        raise ValueError(f"invalid rate limit '{value}', expected e.g. '5/10' for 5 commands per 10 seconds.")
+    return int(match.group(1)), float(match.group(2))
+
+'''
+    Token buckets: each key may burst up to capacity commands, refilled at capacity per `per` seconds
+'''
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    def __init__(self, capacity, per, clock=time.monotonic):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.clock = clock
+        self._buckets = {}
+
+    # Take a token from the key's bucket, returning 0 if one was available, else seconds until one is
+    def hit(self, key):
+        bucket = self._refill(key)
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0.0
+        return (1 - bucket.tokens) / self.rate
+
+    # Seconds until the key's bucket has a token (0 if it has one now), without taking it
+    def wait(self, key):
+        bucket = self._refill(key)
+        return 0.0 if bucket.tokens >= 1 else (1 - bucket.tokens) / self.rate
+
+    # Bring the key's bucket up to date with the tokens refilled since it was last used
+    def _refill(self, key):
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._prune(now)
+            bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        return bucket
+
+    # Drop buckets that have refilled completely; they behave the same as new ones
+    def _prune(self, now):
+        full = [key for key, bucket in self._buckets.items() if bucket.tokens + (now - bucket.updated) * self.rate >= self.capacity]
+        for key in full:
+            del self._buckets[key]
+
+'''
+    Rendered views: results of read-only commands keyed by (guild_id, ...), served for a short TTL.
+    Concurrent requests for the same key share one in-flight computation; invalidating a guild drops its
+    views & keeps computations already running from caching what they read before the change.
+'''
+class ViewCache:
+    def __init__(self, ttl=DEFAULT_VIEW_TTL, max_entries=MAX_VIEWS, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        # key -> (expires_at, value)
+        self._entries = {}
+        # key -> task computing its value
+        self._pending = {}
+        # Number of invalidations of every guild & of each guild, so stale computations are not cached
+        self._generation = 0
+        self._versions = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Cached value of a key, else the result of compute(), a coroutine function, shared by concurrent callers
+    async def get(self, key, compute):
+        entry = self._entries.get(key)
+        if entry and entry[0] > self.clock():
+            metrics.inc('calendar_view_cache_total', result='hit')
+            return entry[1]
+
+        task = self._pending.get(key)
+        if task is None:
+            metrics.inc('calendar_view_cache_total', result='miss')
+            task = self._pending[key] = asyncio.ensure_future(self._compute(key, compute))
+        else:
+            metrics.inc('calendar_view_cache_total', result='coalesced')
+        # A caller giving up (e.g. cancelled) does not cancel the computation the others wait for
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, compute):
+        version = self.version(key[0])
+        try:
+            value = await compute()
+        finally:
+            if self._pending.get(key) is asyncio.current_task():
+                del self._pending[key]
+        if self.ttl > 0 and self.version(key[0]) == version:
+            self._store(key, value)
+        return value
+
+    # Changes whenever the guild's views are invalidated, so it can key results cached elsewhere
+    def version(self, guild_id):
+        return self._generation, self._versions.get(guild_id, 0)
+
+    def _store(self, key, value):
+        now = self.clock()
+        if len(self._entries) >= self.max_entries:
+            for stale in [stale for stale, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale]
+            # Still full: drop the oldest entries
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self.ttl, value)
+
+    # Drop views of one guild, or of every guild when guild_id is None
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._entries.clear()
+            self._pending.clear()
+            self._generation += 1
+            return
+        self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+        for key in [key for key in self._pending if key[0] == guild_id]:
+            del self._pending[key]
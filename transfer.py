@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import re
+import sys
+from datetime import date, datetime, timezone
+
+from storage import create_storage, name_key, event_timestamp
+from validation import validate_date_format, validate_time_format
+
+'''
+    Bulk import & export of events as CSV, JSON Lines or iCalendar (.ics)
+'''
+FIELDS = ('event_name', 'event_date', 'event_time', 'location', 'contact')
+FORMATS = ('csv', 'jsonl', 'ics')
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.ndjson': 'jsonl', '.ics': 'ics', '.ical': 'ics'}
+
+# Guess format from a file name, e.g. 'events.ics' -> 'ics'
+def detect_format(filename):
+    for extension, fmt in EXTENSIONS.items():
+        if filename.lower().endswith(extension):
+            return fmt
+
+'''
+    Parsing: each parser yields (line_number, record dict) pairs
+'''
+def parse_csv(lines):
+    reader = csv.reader(lines)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        # Header row is optional; without one, columns are taken in FIELDS order
+        if reader.line_num == 1 and [cell.strip().lower() for cell in row][:len(FIELDS)] == list(FIELDS):
+            continue
+        yield reader.line_num, dict(zip(FIELDS, row))
+
+def parse_jsonl(lines):
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f'invalid JSON: {e}')
+            continue
+        yield line_number, record if isinstance(record, dict) else ValueError('expected a JSON object')
+
+# Unescape an iCalendar text value
+def ics_unescape(value):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+# Convert an iCalendar DTSTART value to (MM/DD/YYYY, H:MMAM) strings; all-day events start at 12:00AM
+def ics_datetime(value, params):
+    if 'VALUE=DATE' in params or len(value) == 8:
+        starts = datetime.strptime(value[:8], '%Y%m%d')
+    else:
+        starts = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+        if value.endswith('Z'):
+            starts = starts.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    return starts.strftime('%m/%d/%Y'), starts.strftime('%I:%M%p').lstrip('0')
+
+def parse_ics(lines):
+    record, start_line = None, 0
+    unfolded = []
+    # Unfold continuation lines (starting with a space or tab) first
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and unfolded:
+            unfolded[-1] = (unfolded[-1][0], unfolded[-1][1] + line[1:])
+        else:
+            unfolded.append((line_number, line))
+
+    for line_number, line in unfolded:
+        name, _, value = line.partition(':')
+        name, _, params = name.partition(';')
+        name = name.upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            record, start_line = {}, line_number
+        elif name == 'END' and value.upper() == 'VEVENT' and record is not None:
+            yield start_line, record
+            record = None
+        elif record is None:
+            continue
+        elif name == 'SUMMARY':
+            record['event_name'] = ics_unescape(value)
+        elif name == 'LOCATION':
+            record['location'] = ics_unescape(value)
+        elif name == 'CONTACT' or (name == 'ORGANIZER' and 'contact' not in record):
+            cn = re.search(r'CN="?([^";:]+)', params)
+            record['contact'] = cn.group(1) if cn else ics_unescape(re.sub(r'(?i)^mailto:', '', value))
+        elif name == 'DTSTART':
+            try:
+                record['event_date'], record['event_time'] = ics_datetime(value, params.upper())
+            except ValueError:
+                record['event_date'] = value
+
+PARSERS = {'csv': parse_csv, 'jsonl': parse_jsonl, 'ics': parse_ics}
+
+# Validate a record with the same rules as '.add_event', returning the event row to insert
+def validate_record(record):
+    missing = [field for field in FIELDS if not str(record.get(field) or '').strip()]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)}.')
+
+    # Accept exported ISO dates ('2026-10-20') & display times ('9:05 PM') as well as user input format
+    event_date = str(record['event_date']).strip()
+    iso_date = re.fullmatch(r'(\d{4})-(\d{2})-(\d{2})', event_date)
+    if iso_date:
+        event_date = f'{iso_date.group(2)}-{iso_date.group(3)}-{iso_date.group(1)}'
+    formatted_date = validate_date_format(event_date)
+    formatted_time = validate_time_format(str(record['event_time']).replace(' ', ''))
+
+    if not formatted_date or not formatted_time:
+        raise ValueError("event date&time must match format 'MM/DD/YYYY' & 'HH:MM AM/PM'.")
+    if formatted_date < date.today():
+        raise ValueError('cannot set past date as event time.')
+    return (str(record['event_name']).strip(), formatted_date, formatted_time, str(record['location']).strip(), str(record['contact']).strip())
+
+# Validate every parsed record, skipping duplicates of existing_names (case-folded) & of earlier rows.
+# Returns (valid event rows, list of (line_number, error message)).
+def validate_records(parsed, existing_names=()):
+    names = set(existing_names)
+    rows, errors = [], []
+    for line_number, record in parsed:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            row = validate_record(record)
+            if name_key(row[0]) in names:
+                raise ValueError(f"event '{row[0]}' is already on record.")
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        names.add(name_key(row[0]))
+        rows.append(row)
+    return rows, errors
+
+# Parse, validate & insert events into a guild's calendar in a single transaction.
+# Returns (inserted event rows, list of (line_number, error message)).
+async def import_events(storage, guild_id, lines, fmt):
+    parsed = PARSERS[fmt](lines)
+    rows, errors = validate_records(parsed, await storage.get_event_names(guild_id))
+    if rows:
+        await storage.insert_events(guild_id, rows)
+    return rows, errors
+
+'''
+    Formatting: each format has a header, a formatter for one event row & a footer
+'''
+def format_csv_row(row):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+def format_jsonl_row(row):
+    return json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+
+# Escape an iCalendar text value
+def ics_escape(value):
+    return str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+# Fold an iCalendar content line to at most 75 characters per line
+def ics_fold(line):
+    parts = [line[i:i + 74] for i in range(0, len(line), 74)] or ['']
+    return '\r\n '.join(parts) + '\r\n'
+
+def format_ics_row(row):
+    event_name, event_date, event_time, location, contact = row
+    starts = datetime.strptime(event_timestamp(event_date, event_time), '%Y-%m-%d %H:%M')
+    return ''.join(ics_fold(line) for line in (
+        'BEGIN:VEVENT',
+        f'UID:{starts:%Y%m%dT%H%M%S}-{re.sub(r"[^a-z0-9]+", "-", name_key(event_name))}@calendar_bot',
+        f'DTSTAMP:{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}',
+        f'DTSTART:{starts:%Y%m%dT%H%M%S}',
+        f'SUMMARY:{ics_escape(event_name)}',
+        f'LOCATION:{ics_escape(location)}',
+        f'CONTACT:{ics_escape(contact)}',
+        'END:VEVENT',
+    ))
+
+FORMATTERS = {
+    'csv': (format_csv_row(FIELDS), format_csv_row, ''),
+    'jsonl': ('', format_jsonl_row, ''),
+    'ics': ('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//calendar_bot//EN\r\n', format_ics_row, 'END:VCALENDAR\r\n'),
+}
+
+# Stream a guild's events from database as text chunks of the given format, one chunk per event
+async def export_events(storage, guild_id, fmt):
+    header, format_row, footer = FORMATTERS[fmt]
+    yield header
+    async for row in storage.iter_events(guild_id):
+        yield format_row(row)
+    yield footer
+
+# Write an export into a binary file object, returning number of events written
+async def write_export(storage, guild_id, fmt, out):
+    count = -2
+    async for chunk in export_events(storage, guild_id, fmt):
+        out.write(chunk.encode('utf-8'))
+        count += 1
+    return count
+
+'''
+    Offline command line entry point, e.g.
+        python transfer.py import events.csv --guild 1234
+        python transfer.py export --guild 1234 --format ics > events.ics
+'''
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import/export calendar events.')
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('file', nargs='?', help='file to import (default: stdin)')
+    parser.add_argument('--guild', type=int, required=True, help='id of the guild whose calendar to use')
+    parser.add_argument('--format', choices=FORMATS, help='file format (default: from file extension, else csv)')
+    parser.add_argument('--db', default='calendar.db', help='path of the SQLite database, or URL of a PostgreSQL database')
+    args = parser.parse_args(argv)
+
+    storage = create_storage(args.db)
+    await storage.open()
+    try:
+        fmt = args.format or (detect_format(args.file) if args.file else None) or 'csv'
+        if args.action == 'export':
+            count = await write_export(storage, args.guild, fmt, sys.stdout.buffer)
+            print(f'Exported {count} event(s).', file=sys.stderr)
+            return 0
+
+        source = open(args.file, newline='', encoding='utf-8') if args.file else sys.stdin
+        with source:
+            rows, errors = await import_events(storage, args.guild, source, fmt)
+        for line_number, error in errors:
+            print(f'line {line_number}: {error}', file=sys.stderr)
+        print(f'Imported {len(rows)} event(s), skipped {len(errors)} row(s).', file=sys.stderr)
+        return 1 if errors and not rows else 0
+    finally:
+        await storage.close()
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
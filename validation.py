@@ -0,0 +1,28 @@
+import logging
+import re
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# To validate date format
+def validate_date_format(input_date):
+    try:
+        input_date = input_date.replace('/', '-')
+        return datetime.strptime(input_date, '%m-%d-%Y').date()
+    except Exception as e:
+        logger.debug('Error: %s', e)
+
+# To validate time format
+def validate_time_format(input_time):
+    try:
+        match = re.fullmatch('((\d{1}|\d{2}):(\d{2})(AM|PM))', input_time, re.IGNORECASE)
+        if match:
+            hour = int(match.group(2))
+            min = int(match.group(3))
+            time_period = match.group(4).upper()
+            if hour <= 0 or hour >= 13 or min < 0 or min > 59:
+                raise Exception(f'invalid hour or min -> {hour}:{min}.')
+            else:
+                return f'{hour}:{min:02d} {time_period}'
+    except Exception as e:
+        logger.debug('Error: %s', e)